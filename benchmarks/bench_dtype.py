@@ -0,0 +1,114 @@
+"""Runtime, peak RSS, output size and forecast difference of the float32 and float64 nowcast paths.
+
+Each dtype runs preprocessing, motion, STEPS, ensemble reduction and the NetCDF write on the same
+synthetic frames in a fresh process, so the peak RSS of one run does not hide the other.
+
+Usage (from the project root):
+    python -m benchmarks.bench_dtype -c config/config.yaml --size 512 --members 20 --leadtimes 18
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import xarray as xr
+
+from benchmarks.synthetic import rain_field
+from utils.instrument import _peak_rss_mb
+from utils.nc_encoding import write_netcdf
+from utils.read_config import read_run_config
+from utils.run_nowcasting import preprocess_frames, nowcast_frames
+
+DTYPES = ('float64', 'float32')
+
+
+def run_dtype(model_config: dict, dtype: str, size: int, path: str, nc_encoding: str = 'legacy') -> dict:
+    cfg = {'model_config': dict(model_config, dtype=dtype, skip_dry=False, budget=None, motion={'mode': 'full'})}
+    n_frames = model_config['n_input_frames']
+    frames = rain_field(size, size, n_frames)
+    frame_times = [datetime(2025, 10, 9, 11, 0) - timedelta(minutes=10 * (n_frames - 1 - i)) for i in range(n_frames)]
+    metadata = {'geodata': {'projection': '+proj=longlat +datum=WGS84 +no_defs', 'x1': 110.0, 'x2': 110.0 + size * 0.05,
+                            'y1': -5.0, 'y2': -5.0 + size * 0.05, 'yorigin': 'upper'}}
+    rss_start = _peak_rss_mb()
+
+    start = time.perf_counter()
+    R = preprocess_frames(cfg, 'bench', frame_times, lambda indices: frames[indices])
+    ds = nowcast_frames(cfg, 'bench', R, frame_times, metadata)
+    write_netcdf(ds, path, nc_encoding)
+    return {'dtype': dtype, 'seconds': time.perf_counter() - start, 'rss_start_mb': rss_start,
+            'rss_peak_mb': _peak_rss_mb(), 'size_mb': os.path.getsize(path) / 1e6,
+            'variables': {var: str(da.dtype) for var, da in ds.data_vars.items()}}
+
+
+def forecast_difference(reference: xr.Dataset, other: xr.Dataset) -> dict:
+    """Largest and mean absolute difference per variable; for probabilities also the share of changed cells."""
+    diff = {}
+    for var in reference.data_vars:
+        a = reference[var].values.astype('float64')
+        b = other[var].values.astype('float64')
+        d = np.abs(a - b)[np.isfinite(a) & np.isfinite(b)]
+        diff[var] = {'max_abs': float(d.max()) if d.size else 0.0, 'mean_abs': float(d.mean()) if d.size else 0.0}
+        if var.startswith('prob_'):
+            diff[var]['changed'] = float((d > 0).mean()) if d.size else 0.0
+    return diff
+
+
+def bench_dtype(model_config: dict, size: int, repeat: int = 1, nc_encoding: str = 'legacy') -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for dtype in DTYPES:
+            path = os.path.join(tmp, f"{dtype}.nc")
+            runs = []
+            for _ in range(repeat):
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                    runs.append(executor.submit(run_dtype, model_config, dtype, size, path, nc_encoding).result())
+            results[dtype] = min(runs, key=lambda r: r['seconds'])
+
+        with xr.open_dataset(os.path.join(tmp, 'float64.nc')) as reference, \
+                xr.open_dataset(os.path.join(tmp, 'float32.nc')) as other:
+            results['difference'] = forecast_difference(reference.load(), other.load())
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the float32 and float64 nowcast paths.")
+    parser.add_argument('-c', '--config', type=str, required=True, help="Path to the configuration YAML file.")
+    parser.add_argument('--size', type=int, default=512, help="Grid size (size x size pixels).")
+    parser.add_argument('--members', type=int, default=None, help="Number of ensemble members (config if omitted).")
+    parser.add_argument('--leadtimes', type=int, default=None, help="Number of lead times (config if omitted).")
+    parser.add_argument('--reduction', type=str, default=None, choices=['full', 'streaming'],
+                        help="Ensemble reduction mode (config if omitted).")
+    parser.add_argument('--nc-encoding', type=str, default='legacy', help="NetCDF encoding profile of the output.")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per dtype, each in a new process (best is reported).")
+    parser.add_argument('--output', type=str, default=None, help="Optional JSON file for the results.")
+    args = parser.parse_args()
+
+    model_config = read_run_config(args.config)['model_config']
+    if args.members:
+        model_config['n_ens_members'] = args.members
+    if args.leadtimes:
+        model_config['n_leadtimes'] = args.leadtimes
+    if args.reduction:
+        model_config['ensemble_reduction'] = args.reduction
+
+    results = bench_dtype(model_config, args.size, args.repeat, args.nc_encoding)
+    print(f"STEPS {model_config['n_ens_members']} members x {model_config['n_leadtimes']} lead times, "
+          f"{args.size}x{args.size} grid, ensemble_reduction={model_config.get('ensemble_reduction', 'full')}")
+    print(f"{'dtype':>8} {'seconds':>9} {'peak MB':>9} {'+MB':>8} {'file MB':>8}")
+    for dtype in DTYPES:
+        r = results[dtype]
+        print(f"{dtype:>8} {r['seconds']:>9.2f} {r['rss_peak_mb']:>9.0f} {r['rss_peak_mb'] - r['rss_start_mb']:>8.0f} "
+              f"{r['size_mb']:>8.2f}")
+    print(f"\n{'variable':>12} {'max abs':>10} {'mean abs':>10} {'changed':>8}")
+    for var, d in results['difference'].items():
+        changed = f"{d['changed']:.2%}" if 'changed' in d else ''
+        print(f"{var:>12} {d['max_abs']:>10.3g} {d['mean_abs']:>10.3g} {changed:>8}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
@@ -0,0 +1,72 @@
+"""Write time, read time and file size of the NetCDF encoding profiles.
+
+Usage (from the project root):
+    python -m benchmarks.bench_nc_encoding --size 512 --members 20 --leadtimes 18
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import xarray as xr
+
+from benchmarks.synthetic import rain_field
+from utils.nc_encoding import PROFILES, write_netcdf
+from utils.run_nowcasting import convert_to_dataset, compute_ensemble
+
+
+def synthetic_nowcast(size: int, members: int, leadtimes: int, processed: bool = True) -> xr.Dataset:
+    data = np.stack([rain_field(size, size, leadtimes, seed=m) for m in range(members)]).astype('float64')
+    metadata = {'geodata': {'projection': '+proj=longlat +datum=WGS84 +no_defs', 'x1': 110.0, 'x2': 110.0 + size * 0.05,
+                            'y1': -5.0, 'y2': -5.0 + size * 0.05, 'yorigin': 'upper'}}
+    ds = convert_to_dataset(data, metadata, datetime(2025, 10, 9, 11, 10), 10, 2)
+    if processed:
+        ds = compute_ensemble(ds, [1.0, 5.0, 10.0], [10, 50, 90])
+    return ds
+
+
+def bench_nc_encoding(ds: xr.Dataset, profiles: list[str], repeat: int = 1) -> list[dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in profiles:
+            path = os.path.join(tmp, f"{profile}.nc")
+            write_times, read_times = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                write_netcdf(ds, path, profile)
+                write_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                with xr.open_dataset(path) as f:
+                    f.load()
+                read_times.append(time.perf_counter() - start)
+            results.append({'profile': profile, 'write_seconds': min(write_times),
+                            'read_seconds': min(read_times), 'size_mb': os.path.getsize(path) / 1e6})
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare NetCDF encoding profiles for nowcast output.")
+    parser.add_argument('--size', type=int, default=512, help="Grid size (size x size pixels).")
+    parser.add_argument('--members', type=int, default=20, help="Number of ensemble members.")
+    parser.add_argument('--leadtimes', type=int, default=18, help="Number of lead times.")
+    parser.add_argument('--raw', action='store_true', help="Write the full member cube instead of the processed products.")
+    parser.add_argument('--profiles', type=str, default=','.join(PROFILES), help="Comma-separated profiles.")
+    parser.add_argument('--repeat', type=int, default=3, help="Repetitions per profile (best is reported).")
+    parser.add_argument('--output', type=str, default=None, help="Optional JSON file for the results.")
+    args = parser.parse_args()
+
+    ds = synthetic_nowcast(args.size, args.members, args.leadtimes, processed=not args.raw)
+    results = bench_nc_encoding(ds, args.profiles.split(','), args.repeat)
+    print(f"{'raw' if args.raw else 'processed'} output, {args.members} members x {args.leadtimes} lead times, "
+          f"{args.size}x{args.size} grid")
+    print(f"{'profile':>8} {'write s':>8} {'read s':>8} {'MB':>8}")
+    for r in results:
+        print(f"{r['profile']:>8} {r['write_seconds']:>8.2f} {r['read_seconds']:>8.2f} {r['size_mb']:>8.2f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
@@ -0,0 +1,193 @@
+"""End-to-end pipeline benchmark on synthetic SCaMPR data served from a local S3.
+
+Each scenario (grid size x ensemble size x domain count) runs ``main.main()`` in a fresh process
+against a moto server (or ``--endpoint``, any S3-compatible stand-in already holding the files)
+in an empty work directory. The run is repeated warm (frames already ingested). Stage timings
+come from the instrumentation records (``utils.instrument``).
+
+``benchmarks/baseline.json`` is the stored baseline of the default scenario, together with the
+machine and benchmark settings it was recorded on; timings only compare on a similar machine.
+
+Usage (from the project root):
+    python -m benchmarks.bench_pipeline -c config/config.yaml --grids 1201x3601 --members 4,20 --domains 1,8
+    python -m benchmarks.bench_pipeline -c config/config.yaml --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_pipeline -c config/config.yaml --baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import yaml
+
+from benchmarks.synthetic import GLB5_SHAPE, write_glb5_sequence
+from benchmarks.local_s3 import serve_moto
+from utils.read_config import read_run_config
+
+BASE_TIME = datetime(2025, 10, 9, 11, 0)
+REGRESSION_METRICS = ['cold_s', 'warm_s']
+
+
+def domain_info_path(config_path: str) -> str:
+    # domain_boundary.yaml dibaca dari folder config repo, bukan dari project_path produksi
+    return os.path.join(os.path.dirname(os.path.abspath(config_path)), 'domain_boundary.yaml')
+
+
+def scenario_config(base_cfg: dict, config_path: str, workdir: str, endpoint_url: str, domains: list[str],
+                    members: int, leadtimes: int) -> dict:
+    # Semua path proyek dipindahkan ke direktori kerja benchmark
+    project_path = base_cfg['project_path']
+    text = yaml.safe_dump(base_cfg).replace(project_path, workdir)
+    cfg = yaml.safe_load(text)
+    cfg['domain_info'] = domain_info_path(config_path)
+    cfg.update(run_mode='manual', s3_endpoint_url=endpoint_url, domains=domains, domain=domains[0])
+    cfg['model_config'].update(n_ens_members=members, n_leadtimes=leadtimes)
+    cfg['instrument'] = {'enabled': True, 'jsonl': os.path.join(workdir, 'log', 'stages.jsonl')}
+    for key in ('status_path', 'log_path'):
+        os.makedirs(cfg[key], exist_ok=True)
+    return cfg
+
+
+def stage_totals(jsonl: str, since: float) -> dict:
+    totals = {}
+    if not os.path.isfile(jsonl):
+        return totals
+    with open(jsonl) as f:
+        for line in f:
+            record = json.loads(line)
+            if record['finished_at'] >= since:
+                totals[record['stage']] = round(totals.get(record['stage'], 0.0) + record['wall_s'], 4)
+    return totals
+
+
+def run_scenario(config_path: str, workdir: str, endpoint_url: str, domains: list[str], members: int,
+                 leadtimes: int) -> dict:
+    # Dijalankan di proses baru agar cache modul (index, client, cube) tidak terbawa antar skenario
+    import main
+
+    cfg = scenario_config(read_run_config(config_path), config_path, workdir, endpoint_url, domains, members, leadtimes)
+    path = os.path.join(workdir, 'bench_config.yaml')
+    with open(path, 'w') as f:
+        yaml.safe_dump(cfg, f)
+
+    result = {}
+    for run in ('cold', 'warm'):
+        start_epoch = time.time()
+        start = time.perf_counter()
+        main.main(path, BASE_TIME.strftime('%Y%m%d%H%M'), domains)
+        result[f'{run}_s'] = round(time.perf_counter() - start, 3)
+        result[f'{run}_stages'] = stage_totals(cfg['instrument']['jsonl'], start_epoch)
+
+    downloaded = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(cfg['nc_dir']) for f in files)
+    result['domains_per_min'] = round(60 * len(domains) / result['warm_s'], 2)
+    result['ingest_mb_per_s'] = round(downloaded / 1e6 / max(result['cold_s'] - result['warm_s'], 1e-3), 2)
+    return result
+
+
+def machine_info() -> dict:
+    return {'platform': platform.platform(), 'processor': platform.processor() or platform.machine(),
+            'cpu_count': os.cpu_count(), 'python': platform.python_version()}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    if baseline.get('machine') and baseline['machine'] != machine_info():
+        print(f"Baseline was recorded on another machine: {baseline['machine']}")
+    # Baseline lama hanya berisi skenario tanpa metadata
+    baseline = baseline.get('scenarios', baseline)
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        for metric in REGRESSION_METRICS:
+            ratio = result[metric] / baseline[key][metric] if baseline[key].get(metric) else None
+            result.setdefault('vs_baseline', {})[metric] = round(ratio, 3) if ratio else None
+            if ratio and ratio > 1 + tolerance:
+                regressions.append(f"{key} {metric}: {baseline[key][metric]:.2f}s -> {result[metric]:.2f}s (x{ratio:.2f})")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark on synthetic data.")
+    parser.add_argument('-c', '--config', type=str, required=True, help="Path to the configuration YAML file.")
+    parser.add_argument('--grids', type=str, default=f"{GLB5_SHAPE[0]}x{GLB5_SHAPE[1]}",
+                        help="Comma-separated global grid shapes ROWSxCOLS (GLB-5 is 2401x7201).")
+    parser.add_argument('--members', type=str, default='20', help="Comma-separated ensemble sizes.")
+    parser.add_argument('--domains', type=str, default='1',
+                        help="Comma-separated domain counts (first N domains of domain_boundary.yaml).")
+    parser.add_argument('--leadtimes', type=int, default=None, help="Lead times (default from the config).")
+    parser.add_argument('--data-dir', type=str, default=os.path.join(tempfile.gettempdir(), 'scampr_bench_data'),
+                        help="Where synthetic GLB-5 files are generated and reused.")
+    parser.add_argument('--endpoint', type=str, default=None,
+                        help="Existing S3-compatible endpoint that already serves the files, instead of moto.")
+    parser.add_argument('--baseline', type=str, default=None, help="Baseline JSON to compare against.")
+    parser.add_argument('--save-baseline', type=str, default=None, help="Write the results as a new baseline.")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="Allowed slowdown before flagging (0.10 = 10%%).")
+    parser.add_argument('--output', type=str, default=None, help="Optional JSON file for the results.")
+    args = parser.parse_args()
+
+    cfg = read_run_config(args.config)
+    with open(domain_info_path(args.config)) as f:
+        all_domains = list(yaml.safe_load(f).keys())
+    leadtimes = args.leadtimes or cfg['model_config']['n_leadtimes']
+
+    results = {}
+    for grid in args.grids.split(','):
+        shape = tuple(int(n) for n in grid.lower().split('x'))
+        print(f"Generating synthetic GLB-5 files {shape}...")
+        files = write_glb5_sequence(os.path.join(args.data_dir, grid), BASE_TIME, cfg['prior_steps'], shape)
+        if args.endpoint:
+            endpoint_url, stop = args.endpoint, (lambda: None)
+        else:
+            endpoint_url, stop = serve_moto(cfg['bucket_name'], cfg['prefix'], files)
+        try:
+            for members in [int(m) for m in args.members.split(',')]:
+                for n_domains in [int(d) for d in args.domains.split(',')]:
+                    key = f"grid={grid} members={members} domains={n_domains}"
+                    print(f"===== {key} =====")
+                    workdir = tempfile.mkdtemp(prefix='scampr_bench_')
+                    try:
+                        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as ex:
+                            results[key] = ex.submit(run_scenario, args.config, workdir, endpoint_url,
+                                                     all_domains[:n_domains], members, leadtimes).result()
+                    finally:
+                        shutil.rmtree(workdir, ignore_errors=True)
+        finally:
+            stop()
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+    print(f"\n{'scenario':<40} {'cold s':>8} {'warm s':>8} {'dom/min':>8} {'MB/s':>7}  slowest warm stages")
+    for key, r in results.items():
+        slowest = sorted(r['warm_stages'].items(), key=lambda kv: -kv[1])
+        slowest = ', '.join(f"{k} {v:.2f}" for k, v in slowest if k not in ('cycle', 'domain'))[:60]
+        print(f"{key:<40} {r['cold_s']:>8.2f} {r['warm_s']:>8.2f} {r['domains_per_min']:>8.2f} "
+              f"{r['ingest_mb_per_s']:>7.2f}  {slowest}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+    if args.save_baseline:
+        settings = {k: getattr(args, k) for k in ('config', 'grids', 'members', 'domains', 'tolerance')}
+        model_config = cfg['model_config']
+        settings.update(leadtimes=leadtimes, dtype=model_config.get('dtype', 'float64'),
+                        ensemble_reduction=model_config.get('ensemble_reduction', 'full'),
+                        num_workers=model_config.get('num_workers', 1), recorded_at=f"{datetime.now():%Y-%m-%d}")
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'machine': machine_info(), 'settings': settings, 'scenarios': results}, f, indent=4)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
@@ -0,0 +1,64 @@
+"""Interpreter startup and import cost per CLI stage.
+
+Each stage's imports are timed in a fresh interpreter. 'all stages' is what every invocation paid
+when main.py imported the whole pipeline at module load.
+
+Usage (from the project root):
+    python -m benchmarks.bench_startup --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+STAGES = {
+    'cli': ['main'],
+    'download': ['main', 'utils.download_scampr'],
+    'convert': ['main', 'utils.convert_tiff'],
+    'nowcast': ['main', 'utils.run_nowcasting'],
+    'render': ['main', 'utils.generate_png_layer'],
+    'all stages': ['main', 'utils.backfill', 'utils.convert_tiff', 'utils.run_nowcasting', 'utils.generate_png_layer'],
+}
+HEAVY = ['pysteps', 'xarray', 'boto3', 'rasterio', 'matplotlib', 'cartopy', 'scipy']
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+print(json.dumps({{'seconds': time.perf_counter() - start,
+                  'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def bench_startup(stages: dict, repeat: int = 5) -> list[dict]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = []
+    for stage, modules in stages.items():
+        timings, heavy = [], []
+        for _ in range(repeat):
+            code = PROBE.format(modules=modules, heavy=HEAVY)
+            out = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True)
+            probe = json.loads(out.stdout.strip().splitlines()[-1])
+            timings.append(probe['seconds'])
+            heavy = probe['heavy']
+        results.append({'stage': stage, 'seconds': statistics.median(timings), 'heavy_modules': heavy})
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure import cost of each CLI stage.")
+    parser.add_argument('--repeat', type=int, default=5, help="Fresh interpreters per stage (median is reported).")
+    parser.add_argument('--output', type=str, default=None, help="Optional JSON file for the results.")
+    args = parser.parse_args()
+
+    results = bench_startup(STAGES, args.repeat)
+    print(f"{'stage':>12} {'import s':>9}  heavy modules loaded")
+    for r in results:
+        print(f"{r['stage']:>12} {r['seconds']:>9.2f}  {', '.join(r['heavy_modules']) or '-'}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
@@ -0,0 +1,68 @@
+"""STEPS speedup curve across worker counts.
+
+Usage (from the project root):
+    python -m benchmarks.bench_steps_workers -c config/config.yaml --size 256 --workers 1,2,4,8
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from pysteps import nowcasts
+from pysteps.motion.lucaskanade import dense_lucaskanade
+from pysteps.utils import transformation
+
+from benchmarks.synthetic import rain_field
+from utils.read_config import read_run_config
+from utils.run_nowcasting import steps_kwargs
+
+
+def bench_steps_workers(model_config: dict, size: int, workers: list[int], repeat: int = 1) -> list[dict]:
+    R = rain_field(size, size, model_config['n_input_frames'])
+    R, _ = transformation.dB_transform(R, threshold=0.1, zerovalue=-15.0)
+    V = dense_lucaskanade(R)
+    steps = nowcasts.get_method('steps')
+
+    results = []
+    for n in workers:
+        kwargs = steps_kwargs(dict(model_config, num_workers=n))
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            steps(R, V, model_config['n_leadtimes'], model_config['n_ens_members'], **kwargs)
+            timings.append(time.perf_counter() - start)
+        results.append({'workers': n, 'seconds': min(timings)})
+
+    base = results[0]['seconds']
+    for r in results:
+        r['speedup'] = base / r['seconds']
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure STEPS speedup across worker counts.")
+    parser.add_argument('-c', '--config', type=str, required=True, help="Path to the configuration YAML file.")
+    parser.add_argument('--size', type=int, default=256, help="Grid size (size x size pixels).")
+    parser.add_argument('--workers', type=str, default=None,
+                        help="Comma-separated worker counts. Defaults to powers of two up to the core count.")
+    parser.add_argument('--repeat', type=int, default=1, help="Repetitions per worker count (best is reported).")
+    parser.add_argument('--output', type=str, default=None, help="Optional JSON file for the results.")
+    args = parser.parse_args()
+
+    model_config = read_run_config(args.config)['model_config']
+    if args.workers:
+        workers = [int(w) for w in args.workers.split(',')]
+    else:
+        workers = [2 ** i for i in range(int(np.log2(os.cpu_count() or 1)) + 1)]
+
+    results = bench_steps_workers(model_config, args.size, workers, args.repeat)
+    print(f"STEPS {model_config['n_ens_members']} members x {model_config['n_leadtimes']} lead times, "
+          f"{args.size}x{args.size} grid, fft_method={model_config.get('fft_method', 'numpy')}")
+    print(f"{'workers':>8} {'seconds':>10} {'speedup':>8}")
+    for r in results:
+        print(f"{r['workers']:>8} {r['seconds']:>10.2f} {r['speedup']:>8.2f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
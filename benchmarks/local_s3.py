@@ -0,0 +1,38 @@
+import os
+import socket
+from datetime import datetime
+
+import boto3
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def upload_sequence(endpoint_url: str, bucket: str, prefix_template: str, files: list[str]):
+    """Upload GLB-5 files under the hour prefixes the pipeline lists (``prefix`` in the config)."""
+    s3 = boto3.client('s3', endpoint_url=endpoint_url, aws_access_key_id='bench', aws_secret_access_key='bench',
+                      region_name='us-east-1')
+    try:
+        s3.create_bucket(Bucket=bucket)
+    except s3.exceptions.BucketAlreadyOwnedByYou:
+        pass
+    for path in files:
+        time = datetime.strptime(os.path.basename(path).split('_')[3][1:], '%Y%m%d%H%M%S0')
+        key = f"{prefix_template.format(datestring=time.strftime('%Y/%m/%d/%H'))}/{os.path.basename(path)}"
+        # public-read agar klien UNSIGNED pipeline bisa membaca
+        s3.upload_file(path, bucket, key, ExtraArgs={'ACL': 'public-read'})
+
+
+def serve_moto(bucket: str, prefix_template: str, files: list[str], port: int = None):
+    """Start a moto S3 server with ``files`` uploaded. Returns ``(endpoint_url, stop)``."""
+    from moto.server import ThreadedMotoServer
+
+    port = port or free_port()
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=port, verbose=False)
+    server.start()
+    endpoint_url = f"http://127.0.0.1:{port}"
+    upload_sequence(endpoint_url, bucket, prefix_template, files)
+    return endpoint_url, server.stop
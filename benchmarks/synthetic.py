@@ -0,0 +1,77 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import xarray as xr
+
+# Grid GLB-5 (0.05 derajat, 60S-60N), baris dari utara ke selatan
+GLB5_SHAPE = (2401, 7201)
+GLB5_ATTRS = dict(geospatial_lat_min=-60.0, geospatial_lat_max=60.0, geospatial_lon_min=-180.0,
+                  geospatial_lon_max=180.0)
+
+
+def rain_field(ny: int, nx: int, n_frames: int = 12, n_cells: int = None, motion: tuple = (0.5, 1.0),
+               seed: int = 0) -> np.ndarray:
+    """Synthetic rain-rate stack (mm/h) of Gaussian rain cells advected by ``motion`` pixels per frame.
+
+    Cells are modulated by log-normal noise so the power spectrum is close enough to real
+    precipitation for the STEPS parametric noise fit. Returns float32 of shape ``(n_frames, ny, nx)``.
+    """
+    rng = np.random.default_rng(seed)
+    if n_cells is None:
+        n_cells = max(1, ny * nx // 3000)
+    cells = [(rng.uniform(0, ny), rng.uniform(0, nx), rng.uniform(3, 15), rng.uniform(1, 30)) for _ in range(n_cells)]
+
+    frames = np.zeros((n_frames, ny, nx), dtype='float32')
+    for k in range(n_frames):
+        field = frames[k]
+        for cy, cx, s, a in cells:
+            cy, cx = cy + motion[0] * k, cx + motion[1] * k
+            y0, y1 = int(max(0, cy - 4 * s)), int(min(ny, cy + 4 * s))
+            x0, x1 = int(max(0, cx - 4 * s)), int(min(nx, cx + 4 * s))
+            if y1 <= y0 or x1 <= x0:
+                continue
+            y, x = np.mgrid[y0:y1, x0:x1]
+            field[y0:y1, x0:x1] += a * np.exp(-((y - cy) ** 2 + (x - cx) ** 2) / (2 * s * s))
+        field *= np.random.default_rng(seed + 100 + k).lognormal(0, 0.6, field.shape).astype('float32')
+        field[field < 0.1] = 0
+    return frames
+
+
+def glb5_filename(time: datetime) -> str:
+    stamp = f"{time:%Y%m%d%H%M%S}0"
+    return f"RRQPE-INST-GLB-5_v1r1_blend_s{stamp}_e{stamp}_c{stamp}.nc"
+
+
+def write_glb5_sequence(out_dir: str, base_time: datetime, n_frames: int = 12, shape: tuple = GLB5_SHAPE,
+                        rain_window: tuple = (25, -25, 70, 165), seed: int = 0) -> list[str]:
+    """Write ``n_frames`` GLB-5-shaped HDF5 files ending at ``base_time``, 10 minutes apart.
+
+    The global grid is dry except for advected rain cells inside ``rain_window`` (north, south, west,
+    east). ``shape`` may be reduced for quicker runs; the geospatial attributes stay global so the
+    resolution follows the shape. Existing files are reused.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    nrows, ncols = shape
+    north, south, west, east = rain_window
+    r0, r1 = [int(round((60 - lat) / 120 * (nrows - 1))) for lat in (north, south)]
+    c0, c1 = [int(round((lon + 180) / 360 * (ncols - 1))) for lon in (west, east)]
+
+    times = [base_time - timedelta(minutes=10 * (n_frames - 1 - k)) for k in range(n_frames)]
+    paths = [os.path.join(out_dir, glb5_filename(t)) for t in times]
+    if all(os.path.isfile(p) for p in paths):
+        return paths
+
+    rain = rain_field(r1 - r0, c1 - c0, n_frames, seed=seed)
+    resolution = 120 / (nrows - 1)
+    for k, (t, path) in enumerate(zip(times, paths)):
+        data = np.zeros(shape, dtype='float32')
+        data[r0:r1, c0:c1] = rain[k]
+        stamp = t.strftime('%Y-%m-%dT%H:%M:%SZ')
+        ds = xr.Dataset(
+            {"RRQPE": (("Rows", "Columns"), data)},
+            attrs=dict(GLB5_ATTRS, time_coverage_start=stamp, time_coverage_end=stamp,
+                       geospatial_lat_resolution=resolution, geospatial_lon_resolution=360 / (ncols - 1)))
+        encoding = {"RRQPE": dict(zlib=True, complevel=1, chunksizes=(min(300, nrows), min(600, ncols)))}
+        ds.to_netcdf(path, engine='h5netcdf', encoding=encoding)
+    return paths
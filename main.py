@@ -1,29 +1,55 @@
-from utils.download_scampr import download_scampr
-from utils.convert_tiff import convert_tiff
-from utils.run_nowcasting import run_nowcasting
-from utils.generate_png_layer import generate_png_layer
 from utils.read_config import read_run_config, read_path_config
 
 from datetime import datetime, timedelta, UTC
 import yaml
+import hashlib
 import json
 import os
+import time as _time
+import sys
 import argparse
 
+# Modul berat (pysteps, xarray, boto3, matplotlib, ...) diimpor di dalam fungsi tahap yang memakainya,
+# sehingga misalnya `main.py download` tidak ikut memuat pysteps.
+COMMANDS = ('download', 'convert', 'nowcast', 'render', 'publish', 'run', 'daemon')
 
-def main(config: os.PathLike | str, time: str = None):
-    cfg = read_run_config(config)
-    domain_dict = cfg.get('domain_info')
-    nc_dir = cfg.get('nc_dir')
-    nc_latest_file_info = cfg.get('nc_latest_file_info')
-    tif_file_list_info = cfg.get('tif_file_list_info')
-    tif_storage_dir = cfg.get('tif_dir')
-    latest_nowcast_info = cfg.get('latest_nowcast_info')
 
+def resolve_domains(cfg: dict, domains: str | list[str] = None) -> list[str]:
+    # Prioritas: argumen, lalu 'domains' di config, lalu 'domain' tunggal
+    if domains is None:
+        domains = cfg.get('domains') or [cfg['domain']]
+    if isinstance(domains, str):
+        domains = [d.strip() for d in domains.split(',') if d.strip()]
+    if [d.lower() for d in domains] == ['all']:
+        from utils.convert_tiff import read_domain_dictionary
+        domains = list(read_domain_dictionary(cfg['domain_info']).keys())
+    return [d.lower() for d in domains]
+
+
+def use_mosaic(cfg: dict, domains: list[str]) -> tuple[dict, list[str]]:
+    # Mode mosaic: satu nowcast untuk region gabungan, domain-domain dipotong dari hasilnya
+    from utils.grid_index import mosaic_config
+
+    # Region mosaic dibentuk dari domain yang diminta saja, bukan seluruh mosaic.domains
+    mosaic_cfg = mosaic_config(cfg)
+    if mosaic_cfg is None or len(domains) < 2:
+        return cfg, domains
+    allowed = resolve_domains(cfg, mosaic_cfg.get('domains', 'all'))
+    outside = [d for d in domains if d not in allowed]
+    if outside:
+        raise ValueError(f"Domain(s) {', '.join(outside)} are not in mosaic.domains, "
+                         f"add them there or run without mosaic.")
+    name = mosaic_cfg.get('name', 'mosaic')
+    if sorted(domains) != sorted(allowed):
+        # Subset domain: nama region sendiri agar input, cube dan index tidak tertukar dengan region penuh
+        name = f"{name}-{hashlib.sha1(','.join(sorted(domains)).encode()).hexdigest()[:8]}"
+    mosaic_cfg = dict(mosaic_cfg, name=name, domains=domains)
+    return dict(cfg, mosaic=mosaic_cfg, mosaic_domains=domains), [name]
+
+
+def get_base_time(cfg: dict, time: str = None) -> datetime:
+    nc_latest_file_info = cfg.get('nc_latest_file_info')
     run_mode = cfg.get('run_mode', 'auto')
-    tif_filename_template = cfg['tif_filename_template']
-    domain = cfg['domain']
-    prior_steps = cfg['prior_steps']
 
     if run_mode == 'auto':
         if time:
@@ -48,86 +74,418 @@ def main(config: os.PathLike | str, time: str = None):
     else:
         raise ValueError(f"Invalid run_mode: {run_mode}. Must be 'auto' or 'manual'.")
 
-    # Make time list based on latest file available and prior steps 10 minutes each
-    time_list = [base_time - timedelta(minutes=10 * i) for i in range(prior_steps)]
-    time_list = sorted(time_list)
+    return base_time
 
-    # Check if the tif files already exist
-    print("Checking for existing tif files...")
-    tif_files = []
+
+def tif_path(cfg: dict, domain: str, t: datetime) -> str:
+    tif_filename = cfg['tif_filename_template'].format(domain=domain.lower(), datestring=t.strftime('%Y%m%d%H%M000'))
+    tif_dir = cfg.get('tif_dir').format(domain=domain.lower())
+    return os.path.join(tif_dir, tif_filename)
+
+
+def frame_exists(cfg: dict, domain: str, t: datetime) -> bool:
+    """True if ``domain`` has a frame at ``t`` clipped with the current domain index window."""
+    from utils.grid_index import load_domain_index, window_matches, read_tif_window
+    from utils.obs_cube import get_cube, use_cube
+
+    entry = None
+    if cfg.get('domain_index_file'):
+        try:
+            entry = load_domain_index(cfg)[domain]
+        except (FileNotFoundError, KeyError):
+            pass
+
+    # Frame dengan window lama (domain_info, halo atau grid berubah) dianggap hilang dan di-clip ulang
+    if use_cube(cfg):
+        cube = get_cube(cfg, domain)
+        if cube is None or not cube.has(t):
+            return False
+        return entry is None or window_matches(entry, cube.shape, cube.geodata)
+    path = tif_path(cfg, domain, t)
+    if not os.path.exists(path):
+        return False
+    return entry is None or window_matches(entry, *read_tif_window(path))
+
+
+def ingest(cfg: dict, time_list: list[datetime], domains: list[str]) -> dict:
+    """Make sure every domain has an observation frame for every time in ``time_list``.
+
+    Each missing timestep is downloaded and opened once, and all domains that lack it are
+    clipped from that single file. Missing timesteps are backfilled concurrently. Frames are
+    stored as GeoTIFFs or, with ``obs_store.type: cube``, appended to each domain's observation
+    cube. Returns a dict of domain to the list of times available.
+    """
+    from utils.backfill import backfill
+    from utils.obs_cube import get_cube, use_cube
+    from utils.frame_cache import get_frame_cache
+    from utils.instrument import stage
+
+    available = {d: list(time_list) for d in domains}
+
+    # Check if the frames already exist
+    print("Checking for existing observation frames...")
+    missing = {}
     for t in time_list:
-        tif_filename = tif_filename_template.format(domain=domain.lower(), datestring=t.strftime('%Y%m%d%H%M000'))
-        tif_dir = tif_storage_dir.format(domain=domain.lower())
-        tif_filepath = os.path.join(tif_dir, tif_filename)
-        tif_files.append(tif_filepath)
+        missing_domains = [d for d in domains if not frame_exists(cfg, d, t)]
+        if missing_domains:
+            missing[t] = missing_domains
 
-    if all([os.path.exists(f) for f in tif_files]):
-        print("All tif files already exist.")
-    else:
-        print("Checking for missing files")
-        # check missing tif files
-        missing_tif_files = [f for f in tif_files if not os.path.exists(f)]
-        # take time string from filename
-        missing_time_list = [os.path.basename(f).split('_')[2].split('.')[0] for f in missing_tif_files]
-        print(f"Missing {len(missing_tif_files)} tif files. Proceeding to download and convert...")
-        for t, f in zip(missing_time_list, missing_tif_files):
-            try:
-                print(f"Downloading and converting for time: {t}")
-                download_scampr(cfg, t)
-                convert_tiff(cfg, t)
-            except Exception as e:
-                print(f"{t} skipped due to error: {e}")
-                # hapus dari tif_files jika gagal
-                if f in tif_files:
-                    tif_files.remove(f)
-
-    print(f"Tif files ready: {tif_files}")
-    #check latest tif file time and modify base time
-    latest_tif_time_str = os.path.basename(tif_files[-1]).split('_')[2].split('.')[0]
-    latest_tif_time = datetime.strptime(latest_tif_time_str, '%Y%m%d%H%M000').replace(tzinfo=UTC)
-    if latest_tif_time != base_time:
-        print(f"Adjusting base_time from {base_time} to {latest_tif_time} based on latest tif file.")
-        base_time = latest_tif_time
-
-    #check if at least 3 tif files are in sequence
-    tif_times = [datetime.strptime(os.path.basename(f).split('_')[2].split('.')[0], '%Y%m%d%H%M000').replace(tzinfo=UTC) for f in tif_files]
-    tif_times_sorted = sorted(tif_times)
-    time_diffs = [(tif_times_sorted[i] - tif_times_sorted[i-1]).total_seconds() / 60 for i in range(1, len(tif_times_sorted))]
+    if not missing:
+        print("All observation frames already exist.")
+        return available
+
+    print(f"Missing {len(missing)} timesteps for {len(domains)} domain(s). Proceeding to download and convert...")
+    with stage(cfg, 'backfill', frame_time=time_list[-1]):
+        results = backfill(cfg, missing)
+    new_frames = {d: [] for d in domains}
+    geodata = {}
+    frame_cache = get_frame_cache(cfg)
+    for t, result in results.items():
+        if frame_cache and not isinstance(result, Exception):
+            # frame baru menggantikan versi lama yang mungkin ada di cache
+            for d in missing[t]:
+                frame_cache.invalidate(d, t)
+        if isinstance(result, Exception):
+            print(f"{t:%Y%m%d%H%M000} skipped due to error: {result}")
+            # hapus dari daftar jika gagal
+            for d in missing[t]:
+                if t in available[d] and not frame_exists(cfg, d, t):
+                    available[d].remove(t)
+        elif use_cube(cfg):
+            for d, (frame, frame_geodata) in result.items():
+                new_frames[d].append((t, frame))
+                geodata[d] = frame_geodata
+
+    for d, frames in new_frames.items():
+        if frames:
+            with stage(cfg, 'cube_append', domain=d, frame_time=time_list[-1]) as record:
+                get_cube(cfg, d, frames[0][1].shape, geodata[d]).append_many(frames)
+                record['bytes_out'] += sum(frame.nbytes for _, frame in frames)
+
+    return available
+
+
+def run_domain(cfg: dict, times: list[datetime], base_time: datetime):
+    from utils.instrument import stage
+
+    nowcast_time = max(times) + timedelta(minutes=10) if times else None
+    with stage(cfg, 'domain', domain=cfg['domain'], base_time=nowcast_time):
+        if cfg.get('mosaic_domains') is not None:
+            run_mosaic(cfg, times, base_time, cfg['mosaic_domains'])
+        else:
+            _run_domain(cfg, times, base_time)
+
+
+def check_frames(cfg: dict, times: list[datetime], base_time: datetime) -> tuple[list[datetime], datetime]:
+    prior_steps = cfg['prior_steps']
+
+    times = sorted(times)
+    print(f"Observation frames ready for {cfg['domain']}: {[t.strftime('%Y%m%d%H%M000') for t in times]}")
+    #check latest frame time and modify base time
+    latest_frame_time = times[-1].replace(tzinfo=UTC)
+    if latest_frame_time != base_time:
+        print(f"Adjusting base_time from {base_time} to {latest_frame_time} based on latest frame.")
+        base_time = latest_frame_time
+
+    #check if at least 3 frames are in sequence
+    time_diffs = [(times[i] - times[i-1]).total_seconds() / 60 for i in range(1, len(times))]
 
     if not all([diff == 10 for diff in time_diffs[-(prior_steps-1):]]):
-        raise ValueError("Tif files are not in sequence of 10 minutes interval. Please check the available tif files.")
+        raise ValueError("Observation frames are not in sequence of 10 minutes interval. Please check the available frames.")
+    return times, base_time
+
+
+def save_latest_nowcast(cfg: dict, output_file: str, ds, base_time: datetime):
+    print("Saving latest_nowcast_available.json...")
+    latest_nowcast = {
+        'base_time': (base_time+timedelta(minutes=10)).strftime('%Y%m%d%H%M000'),
+        'file_path': output_file,
+        'tier': ds.attrs.get('nowcast_tier', 'full'),
+        'n_ens_members': int(ds.attrs.get('n_ens_members', cfg['model_config']['n_ens_members'])),
+    }
+
+    latest_nowcast_info = cfg.get('latest_nowcast_info').format(domain=cfg['domain'].lower())
+    with open(latest_nowcast_info, 'w') as f:
+        json.dump(latest_nowcast, f, indent=4)
+
 
-    # Save the tif file list to a json file
-    print("Saving tif file list...")
-    tif_file_list_info = tif_file_list_info.format(domain=domain.lower())
-    with open(tif_file_list_info, 'w') as f:
-        json.dump(tif_files, f, indent=4)
+def _run_domain(cfg: dict, times: list[datetime], base_time: datetime):
+    from utils.obs_cube import use_cube
+    from utils.run_nowcasting import run_nowcasting
+
+    domain = cfg['domain']
+    tif_file_list_info = cfg.get('tif_file_list_info')
+    times, base_time = check_frames(cfg, times, base_time)
 
     print("Running nowcasting model...")
-    output_file,ds = run_nowcasting(cfg, tif_file_list_info, processed_output=True)
+    if use_cube(cfg):
+        output_file, ds = run_nowcasting(cfg, None, processed_output=True, times=times)
+    else:
+        # Save the tif file list to a json file
+        print("Saving tif file list...")
+        tif_files = [tif_path(cfg, domain, t) for t in times]
+        tif_file_list_info = tif_file_list_info.format(domain=domain.lower())
+        with open(tif_file_list_info, 'w') as f:
+            json.dump(tif_files, f, indent=4)
+        output_file, ds = run_nowcasting(cfg, tif_file_list_info, processed_output=True)
+
     if ds:
         print("Nowcasting completed successfully.")
+        save_latest_nowcast(cfg, output_file, ds, base_time)
+    else:
+        print("Nowcasting failed.")
 
-        print("Saving latest_nowcast_available.json...")
-        latest_nowcast = {
-            'base_time': (base_time+timedelta(minutes=10)).strftime('%Y%m%d%H%M000'),
-            'file_path': output_file,
-        }
+    render_and_publish(cfg, output_file, ds, base_time)
 
-        latest_nowcast_info = latest_nowcast_info.format(domain=domain.lower())
-        with open(latest_nowcast_info, 'w') as f:
-            json.dump(latest_nowcast, f, indent=4)
 
+def run_mosaic(cfg: dict, times: list[datetime], base_time: datetime, domains: list[str] = None):
+    """Nowcast the mosaic region (``cfg['domain']`` is the mosaic name) once, then write, render and
+    publish every domain in ``domains`` from slices of it."""
+    from utils.obs_cube import use_cube
+    from utils.mosaic import run_mosaic_nowcast
+
+    mosaic = cfg['domain']
+    times, base_time = check_frames(cfg, times, base_time)
+    domains = [d for d in (domains or []) if d != mosaic]
+
+    print(f"Running mosaic nowcast for {len(domains)} domain(s)...")
+    if use_cube(cfg):
+        output_file, ds, outputs = run_mosaic_nowcast(cfg, domains, times=times)
     else:
-        print("Nowcasting failed.")
+        output_file, ds, outputs = run_mosaic_nowcast(cfg, domains, tif_files=[tif_path(cfg, mosaic, t) for t in times])
+    save_latest_nowcast(cfg, output_file, ds, base_time)
 
-    generate_png_layer(cfg)
+    failed = []
+    for domain, (domain_file, domain_ds) in outputs.items():
+        print(f"===== Domain: {domain} (from mosaic {mosaic}) =====")
+        try:
+            domain_cfg = dict(cfg, domain=domain)
+            save_latest_nowcast(domain_cfg, domain_file, domain_ds, base_time)
+            render_and_publish(domain_cfg, domain_file, domain_ds, base_time)
+        except Exception as e:
+            print(f"Domain {domain} failed: {e}")
+            failed.append(domain)
+    if failed:
+        print(f"{len(failed)} of {len(outputs)} domains failed: {failed}")
+
+
+def render_and_publish(cfg: dict, output_file: str, ds, base_time: datetime):
+    from utils.generate_png_layer import generate_png_layer
+    from utils.publisher import get_publisher
+
+    domain = cfg['domain']
+    publisher = get_publisher(cfg) if ds else None
+    if publisher is None:
+        generate_png_layer(cfg)
+        return
+
+    # NetCDF dan layer PNG diunggah sambil lead time berikutnya dirender, JSON status terakhir
+    remote_dir = publisher.domain_dir(domain)
+    png_dir = f"{remote_dir}/png/{base_time + timedelta(minutes=10):%Y%m%d%H%M}"
+    uploads = [publisher.submit(output_file, f"{remote_dir}/nc/{os.path.basename(output_file)}")]
+
+    def publish_layer(local_file: str, relpath: str):
+        uploads.append(publisher.submit(local_file, f"{png_dir}/{relpath}"))
+
+    generate_png_layer(cfg, on_layer=publish_layer)
+    publish_status(cfg, publisher, uploads)
+
+
+def publish_status(cfg: dict, publisher, uploads: list):
+    """Wait for ``uploads``, then publish the latest nowcast and png JSON of the domain.
+
+    The status files go last, so a client that sees a new JSON can fetch every file it lists.
+    """
+    from utils.instrument import stage
+
+    domain = cfg['domain'].lower()
+    remote_dir = publisher.domain_dir(domain)
+    with stage(cfg, 'publish', domain=domain) as record:
+        summary = publisher.wait(uploads)
+        if not summary['failed']:
+            status_files = [cfg[key].format(domain=domain) for key in ('latest_nowcast_info', 'latest_png_info')]
+            status = publisher.wait([publisher.submit(f, f"{remote_dir}/{os.path.basename(f)}") for f in status_files])
+            summary = {k: summary[k] + status[k] for k in summary}
+        else:
+            print("Status JSON not published because some uploads failed.")
+        record['bytes_out'] += summary['bytes']
+    print(f"Published {summary['uploaded']} file(s) to {remote_dir} ({summary['bytes'] / 1e6:.1f} MB), "
+          f"{summary['skipped']} unchanged, {summary['failed']} failed.")
+
+
+def main(config: os.PathLike | str, time: str = None, domains: str | list[str] = None):
+    from utils.instrument import stage
+    from utils.publisher import close_publishers
+
+    cfg = read_run_config(config)
+    prior_steps = cfg['prior_steps']
+    base_time = get_base_time(cfg, time)
+    domains = resolve_domains(cfg, domains)
+    cfg, domains = use_mosaic(cfg, domains)
+
+    # Make time list based on latest file available and prior steps 10 minutes each
+    time_list = [base_time - timedelta(minutes=10 * i) for i in range(prior_steps)]
+    time_list = sorted(time_list)
+
+    # Awal siklus menjadi acuan deadline nowcast (model_config.budget)
+    cfg = dict(cfg, cycle_start=_time.time())
+    try:
+        with stage(cfg, 'cycle', base_time=base_time + timedelta(minutes=10)):
+            available = ingest(cfg, time_list, domains)
+
+            if len(domains) == 1:
+                run_domain(dict(cfg, domain=domains[0]), available[domains[0]], base_time)
+                return
+
+            # Multi-domain: satu domain gagal tidak menghentikan domain lainnya
+            failed = []
+            for domain in domains:
+                print(f"===== Domain: {domain} =====")
+                try:
+                    run_domain(dict(cfg, domain=domain), available[domain], base_time)
+                except Exception as e:
+                    print(f"Domain {domain} failed: {e}")
+                    failed.append(domain)
+
+            if failed:
+                print(f"{len(failed)} of {len(domains)} domains failed: {failed}")
+    finally:
+        # Koneksi FTP dan manifest ditutup juga jika siklus gagal
+        close_publishers()
+
+
+def download(config: os.PathLike | str, time: str = None):
+    from utils.download_scampr import download_scampr
+
+    # download_scampr memakai format datestring file (YYYYMMDDHHMM000)
+    if time and len(time) == 12:
+        time = f"{time}000"
+    download_scampr(config, time)
+
+
+def convert(config: os.PathLike | str, time: str = None, domains: str | list[str] = None):
+    from utils.convert_tiff import convert_tiff_domains
+
+    cfg = read_run_config(config)
+    convert_tiff_domains(cfg, time, resolve_domains(cfg, domains))
+
+
+def nowcast(config: os.PathLike | str, time: str = None, domains: str | list[str] = None,
+            tif_files: str = None, processed_output: bool = True):
+    from utils.obs_cube import use_cube
+    from utils.run_nowcasting import run_nowcasting
+
+    cfg = read_run_config(config)
+    times = None
+    if use_cube(cfg) and not tif_files:
+        base_time = get_base_time(cfg, time)
+        times = sorted(base_time - timedelta(minutes=10 * i) for i in range(cfg['prior_steps']))
+    if tif_files and not tif_files.endswith('.json'):
+        tif_files = tif_files.split(',')
+
+    for domain in resolve_domains(cfg, domains):
+        output_file, _ = run_nowcasting(dict(cfg, domain=domain), tif_files, processed_output=processed_output,
+                                        times=times)
+        print(f"Nowcast saved to: {output_file}")
+
+
+def render(config: os.PathLike | str, domains: str | list[str] = None):
+    from utils.generate_png_layer import generate_png_layer
+
+    cfg = read_run_config(config)
+    for domain in resolve_domains(cfg, domains):
+        generate_png_layer(dict(cfg, domain=domain))
+
+
+def publish(config: os.PathLike | str, domains: str | list[str] = None):
+    from utils.publisher import get_publisher, close_publishers
+
+    cfg = read_run_config(config)
+    publisher = get_publisher(cfg)
+    if publisher is None:
+        raise ValueError("FTP publishing is disabled. Set ftp.enabled in the config.")
+
+    try:
+        for domain in resolve_domains(cfg, domains):
+            with open(cfg['latest_nowcast_info'].format(domain=domain), 'r') as f:
+                latest_nowcast = json.load(f)
+            basetime = latest_nowcast['base_time'][:12]
+            remote_dir = publisher.domain_dir(domain)
+            uploads = [publisher.submit(latest_nowcast['file_path'],
+                                        f"{remote_dir}/nc/{os.path.basename(latest_nowcast['file_path'])}")]
+            # File yang tidak berubah sejak unggahan terakhir dilewati lewat manifest
+            png_storage_dir = cfg['png_layer_dir'].format(domain=domain, basetime=basetime)
+            for root, _, files in os.walk(png_storage_dir):
+                for name in sorted(files):
+                    local_file = os.path.join(root, name)
+                    relpath = os.path.relpath(local_file, png_storage_dir).replace(os.sep, '/')
+                    uploads.append(publisher.submit(local_file, f"{remote_dir}/png/{basetime}/{relpath}"))
+            publish_status(dict(cfg, domain=domain), publisher, uploads)
+    finally:
+        close_publishers()
+
+
+def daemon(config: os.PathLike | str, domains: str | list[str] = None):
+    import signal
+    from utils.scheduler import Scheduler
+    # Dimuat sekali di awal agar siklus pertama tidak menanggung biaya import
+    import utils.run_nowcasting, utils.generate_png_layer
+
+    cfg = read_run_config(config)
+    cfg, domains = use_mosaic(cfg, resolve_domains(cfg, domains))
+    scheduler = Scheduler(cfg, domains, ingest, run_domain)
+    signal.signal(signal.SIGTERM, lambda signum, frame: scheduler.stop())
+    scheduler.run()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="SCAMP Nowcasting Pipeline",
+                                     epilog="Without a command, 'run' is assumed (main.py -c config.yaml [-t TIME]).")
+    subparsers = parser.add_subparsers(dest='command', metavar='{' + ','.join(COMMANDS) + '}')
+
+    def add_command(name: str, help: str, time: bool = True, domains: bool = True) -> argparse.ArgumentParser:
+        sub = subparsers.add_parser(name, help=help, description=help)
+        sub.add_argument('-c','--config', type=str, required=True, help='Path to configuration YAML file')
+        if time:
+            sub.add_argument('-t','--time', type=str, default=None, help='Optional time string in YYYYMMDDHHMM format')
+        if domains:
+            sub.add_argument('-d','--domains', type=str, default=None,
+                             help="Optional comma-separated list of domains, or 'all' for every domain in domain_boundary.yaml")
+        return sub
+
+    add_command('download', "Download the latest (or given) SCaMPR file from AWS S3", domains=False)
+    add_command('convert', "Clip the SCaMPR NetCDF to the domain GeoTIFFs")
+    sub = add_command('nowcast', "Run the STEPS nowcast for the domain(s)")
+    sub.add_argument('--tif_files', type=str, default=None,
+                     help="JSON file containing a list of GeoTIFF files, or a comma-separated list of file paths")
+    sub.add_argument('--raw', action='store_true', help="Write the ensemble members instead of the processed products")
+    add_command('render', "Generate the PNG layers of the latest nowcast", time=False)
+    add_command('publish', "Upload the latest nowcast, PNG layers and status JSON over FTP", time=False)
+    add_command('run', "Full pipeline: download, convert, nowcast, render and (with ftp.enabled) publish")
+    add_command('daemon', "Resident scheduler: poll for new frames and run the pipeline as they land", time=False)
+    return parser
 
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="SCAMP Nowcasting Pipeline")
-    parser.add_argument('-c','--config', type=str, required=True, help='Path to configuration YAML file')
-    parser.add_argument('-t','--time', type=str, default=None, help='Optional time string in YYYYMMDDHHMM format')
-    args = parser.parse_args()
+    argv = sys.argv[1:]
+    # Kompatibel dengan pemanggilan lama `main.py -c config.yaml -t ...`
+    if argv and argv[0] not in COMMANDS and argv[0] not in ('-h', '--help'):
+        argv = ['run'] + argv
+    args = build_parser().parse_args(argv)
 
-    main(args.config, args.time)
\ No newline at end of file
+    if args.command == 'download':
+        download(args.config, args.time)
+    elif args.command == 'convert':
+        convert(args.config, args.time, args.domains)
+    elif args.command == 'nowcast':
+        nowcast(args.config, args.time, args.domains, args.tif_files, processed_output=not args.raw)
+    elif args.command == 'render':
+        render(args.config, args.domains)
+    elif args.command == 'publish':
+        publish(args.config, args.domains)
+    elif args.command == 'run':
+        main(args.config, args.time, args.domains)
+    elif args.command == 'daemon':
+        daemon(args.config, args.domains)
+    else:
+        build_parser().print_help()
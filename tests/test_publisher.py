@@ -0,0 +1,111 @@
+import json
+import os
+import threading
+
+import pytest
+
+from utils.publisher import FTPPool, Publisher, get_publisher, close_publishers
+
+pyftpdlib = pytest.importorskip('pyftpdlib')
+from pyftpdlib.authorizers import DummyAuthorizer  # noqa: E402
+from pyftpdlib.handlers import FTPHandler  # noqa: E402
+from pyftpdlib.servers import ThreadedFTPServer  # noqa: E402
+
+
+@pytest.fixture
+def ftp_server(tmp_path):
+    root = tmp_path / 'ftproot'
+    root.mkdir()
+    received = []
+
+    class RecordingHandler(FTPHandler):
+        def on_file_received(self, file):
+            received.append(os.path.relpath(file, root).replace(os.sep, '/'))
+
+    authorizer = DummyAuthorizer()
+    authorizer.add_user('user', 'secret', str(root), perm='elradfmwMT')
+    RecordingHandler.authorizer = authorizer
+    server = ThreadedFTPServer(('127.0.0.1', 0), RecordingHandler)
+    thread = threading.Thread(target=server.serve_forever, kwargs={'timeout': 0.1, 'handle_exit': False},
+                              daemon=True)
+    thread.start()
+    yield {'root': root, 'port': server.address[1], 'received': received}
+    server.close_all()
+    thread.join(timeout=5)
+
+
+def make_publisher(ftp_server, manifest_file=None) -> Publisher:
+    pool = FTPPool('127.0.0.1', ftp_server['port'], 'user', 'secret', size=2, timeout=10)
+    return Publisher(pool, '/nowcast/{domain}', manifest_file)
+
+
+def remote_files(root) -> list[str]:
+    return sorted(os.path.relpath(os.path.join(d, f), root).replace(os.sep, '/')
+                  for d, _, files in os.walk(root) for f in files)
+
+
+def test_uploads_under_temporary_name_then_renames(ftp_server, tmp_path):
+    local_file = tmp_path / 'layer.png'
+    local_file.write_bytes(b'png' * 1000)
+
+    publisher = make_publisher(ftp_server)
+    remote_dir = publisher.domain_dir('Kalsel')
+    summary = publisher.wait([publisher.submit(str(local_file), f"{remote_dir}/png/202510091100/layer.png")])
+    publisher.close()
+
+    assert summary == {'uploaded': 1, 'skipped': 0, 'failed': 0, 'bytes': 3000}
+    assert ftp_server['received'] == ['nowcast/kalsel/png/202510091100/.layer.png.part']
+    assert remote_files(ftp_server['root']) == ['nowcast/kalsel/png/202510091100/layer.png']
+    assert (ftp_server['root'] / 'nowcast/kalsel/png/202510091100/layer.png').read_bytes() == b'png' * 1000
+
+
+def test_replaces_existing_remote_file(ftp_server, tmp_path):
+    local_file = tmp_path / 'latest.json'
+    publisher = make_publisher(ftp_server)
+    for content in (b'{"v": 1}', b'{"v": 2}'):
+        local_file.write_bytes(content)
+        assert publisher.wait([publisher.submit(str(local_file), '/nowcast/latest.json')])['uploaded'] == 1
+    publisher.close()
+
+    assert remote_files(ftp_server['root']) == ['nowcast/latest.json']
+    assert (ftp_server['root'] / 'nowcast/latest.json').read_bytes() == b'{"v": 2}'
+
+
+def test_manifest_skips_unchanged_files(ftp_server, tmp_path):
+    local_file = tmp_path / 'nowcast.nc'
+    local_file.write_bytes(b'a' * 100)
+    manifest_file = tmp_path / 'status' / 'ftp_manifest.json'
+
+    publisher = make_publisher(ftp_server, str(manifest_file))
+    assert publisher.wait([publisher.submit(str(local_file), '/nowcast/nc/nowcast.nc')])['uploaded'] == 1
+    assert publisher.wait([publisher.submit(str(local_file), '/nowcast/nc/nowcast.nc')])['skipped'] == 1
+    publisher.close()
+    assert len(ftp_server['received']) == 1
+    assert json.loads(manifest_file.read_text())['/nowcast/nc/nowcast.nc']['size'] == 100
+
+    # Manifest dibaca lagi oleh publisher baru (siklus berikutnya)
+    publisher = make_publisher(ftp_server, str(manifest_file))
+    assert publisher.wait([publisher.submit(str(local_file), '/nowcast/nc/nowcast.nc')])['skipped'] == 1
+    local_file.write_bytes(b'b' * 100)
+    assert publisher.wait([publisher.submit(str(local_file), '/nowcast/nc/nowcast.nc')])['uploaded'] == 1
+    publisher.close()
+    assert len(ftp_server['received']) == 2
+
+
+def test_close_publishers_drops_the_shared_publisher(ftp_server, tmp_path):
+    cfg = {'ftp': {'enabled': True, 'host': '127.0.0.1', 'port': ftp_server['port'], 'user': 'user',
+                   'passwd': 'secret', 'manifest': str(tmp_path / 'manifest.json')}}
+    local_file = tmp_path / 'a.txt'
+    local_file.write_bytes(b'a')
+
+    publisher = get_publisher(cfg)
+    assert get_publisher(cfg) is publisher
+    publisher.submit(str(local_file), '/a.txt')
+    close_publishers()
+
+    # Unggahan yang masih antre selesai dan manifest tersimpan sebelum ditutup
+    assert remote_files(ftp_server['root']) == ['a.txt']
+    assert '/a.txt' in json.loads((tmp_path / 'manifest.json').read_text())
+    assert get_publisher(cfg) is not publisher
+    close_publishers()
+    assert get_publisher({'ftp': {'enabled': False}}) is None
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta, UTC
+
+import boto3
+import pytest
+
+from utils import s3_index
+from utils.s3_index import ListingIndex, get_listing_index
+
+mock_aws = pytest.importorskip('moto').mock_aws
+
+BUCKET = 'noaa-enterprise-rainrate-pds'
+CLOSED_PREFIX = 'BLEND/RainRate-Blend-INST/2025/10/09/11/'
+
+
+def glb5_key(prefix: str, i: int) -> str:
+    return f"{prefix}RRQPE-INST-GLB-5_v1r0_blend_s2025100911{i:05d}_e0_c0.nc"
+
+
+@pytest.fixture
+def client():
+    with mock_aws():
+        s3 = boto3.client('s3', region_name='us-east-1')
+        s3.create_bucket(Bucket=BUCKET)
+        yield s3
+
+
+@pytest.fixture
+def count_listings(monkeypatch):
+    calls = []
+    list_all = ListingIndex._list_all
+
+    def counting(self, prefix):
+        calls.append(prefix)
+        return list_all(self, prefix)
+
+    monkeypatch.setattr(ListingIndex, '_list_all', counting)
+    return calls
+
+
+def open_prefix() -> str:
+    return f"BLEND/RainRate-Blend-INST/{datetime.now(UTC):%Y/%m/%d/%H}/"
+
+
+def test_lists_all_pages_and_filters_product(client):
+    for i in range(1105):
+        client.put_object(Bucket=BUCKET, Key=glb5_key(CLOSED_PREFIX, i), Body=b'')
+    client.put_object(Bucket=BUCKET, Key=f"{CLOSED_PREFIX}RRQPE-INST-CONUS_s20251009110000.nc", Body=b'')
+
+    objects = ListingIndex(BUCKET, client=client).list(CLOSED_PREFIX)
+    assert len(objects) == 1105
+    assert all('GLB-5' in obj['Key'] for obj in objects)
+
+
+def test_open_hour_is_relisted_after_ttl(client, count_listings):
+    prefix = open_prefix()
+    client.put_object(Bucket=BUCKET, Key=glb5_key(prefix, 0), Body=b'')
+    index = ListingIndex(BUCKET, client=client, ttl=60)
+    assert len(index.list(prefix)) == 1
+
+    client.put_object(Bucket=BUCKET, Key=glb5_key(prefix, 1), Body=b'')
+    assert len(index.list(prefix)) == 1
+    assert len(count_listings) == 1
+
+    index._entries[prefix]['listed_at'] -= 61
+    assert len(index.list(prefix)) == 2
+    assert len(count_listings) == 2
+
+
+def test_closed_hour_is_never_relisted(client, count_listings, tmp_path):
+    client.put_object(Bucket=BUCKET, Key=glb5_key(CLOSED_PREFIX, 0), Body=b'')
+    cache_file = str(tmp_path / 'listing.json')
+    index = ListingIndex(BUCKET, client=client, ttl=0, cache_file=cache_file)
+    assert index.is_closed(CLOSED_PREFIX)
+    assert len(index.list(CLOSED_PREFIX)) == 1
+
+    client.put_object(Bucket=BUCKET, Key=glb5_key(CLOSED_PREFIX, 1), Body=b'')
+    assert len(index.list(CLOSED_PREFIX)) == 1
+
+    # Jam yang tertutup juga dibaca dari cache_file oleh proses berikutnya
+    reloaded = ListingIndex(BUCKET, client=client, ttl=0, cache_file=cache_file)
+    assert [obj['Key'] for obj in reloaded.list(CLOSED_PREFIX)] == [glb5_key(CLOSED_PREFIX, 0)]
+    assert count_listings == [CLOSED_PREFIX]
+
+
+def test_hour_closes_after_grace():
+    index = ListingIndex(BUCKET, client=object(), closed_grace=timedelta(minutes=30))
+    hour_end = datetime(2025, 10, 9, 12, tzinfo=UTC)
+    assert not index.is_closed(CLOSED_PREFIX, hour_end + timedelta(minutes=29))
+    assert index.is_closed(CLOSED_PREFIX, hour_end + timedelta(minutes=30))
+
+
+def test_index_is_cached_per_endpoint_and_bucket(monkeypatch):
+    monkeypatch.setattr(s3_index, '_INDEXES', {})
+    cfg = {'bucket_name': BUCKET, 's3_endpoint_url': 'http://127.0.0.1:9000'}
+    index = get_listing_index(cfg)
+    assert get_listing_index(dict(cfg)) is index
+    assert get_listing_index(dict(cfg, s3_endpoint_url='http://127.0.0.1:9001')) is not index
@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from datetime import datetime
+try:
+    from download_scampr import fetch_scampr, save_scampr
+    from convert_tiff import convert_tiff_domains, clip_frames
+    from obs_cube import use_cube
+    from instrument import stage
+except ModuleNotFoundError:
+    from utils.download_scampr import fetch_scampr, save_scampr
+    from utils.convert_tiff import convert_tiff_domains, clip_frames
+    from utils.obs_cube import use_cube
+    from utils.instrument import stage
+
+
+def decode_timestep(cfg: dict, time: str, raw_file: str | None, domains: list[str]):
+    # Dijalankan di process pool: decode file global lalu clip semua domain
+    with stage(cfg, 'decode', frame_time=time[:12]) as record:
+        if raw_file is not None:
+            record['bytes_out'] += os.path.getsize(save_scampr(cfg, raw_file, time))
+        if use_cube(cfg):
+            # Frame dikembalikan ke proses utama yang menulis ke observation cube
+            return clip_frames(cfg, time, domains)[1]
+        tif_files = convert_tiff_domains(cfg, time, domains)
+        record['bytes_out'] += sum(os.path.getsize(f) for f in tif_files.values())
+        return tif_files
+
+
+def _fetch(cfg: dict, time: str) -> str | None:
+    with stage(cfg, 'download', frame_time=time[:12]) as record:
+        key, raw_file = fetch_scampr(cfg, time)
+        if raw_file is not None:
+            record['bytes_in'] += os.path.getsize(raw_file)
+    return raw_file
+
+
+def backfill(cfg: dict, missing: dict[datetime, list[str]]) -> dict[datetime, dict | Exception]:
+    """Download and convert missing timesteps concurrently.
+
+    S3 reads run in a thread pool and the decode/clip step runs in a process pool, each bounded
+    by the ``backfill`` section of the config. Every timestep is attempted independently; the
+    returned dict maps each timestep to the decode result (GeoTIFF paths, or clipped frames with
+    the cube store) on success, or to the exception that stopped it.
+    """
+    backfill_cfg = cfg.get('backfill') or {}
+    download_workers = max(1, int(backfill_cfg.get('download_workers', 4)))
+    decode_workers = max(1, int(backfill_cfg.get('decode_workers', min(4, os.cpu_count() or 1))))
+
+    results = {}
+    if not missing:
+        return results
+
+    print(f"Backfilling {len(missing)} timesteps with {download_workers} download and "
+          f"{decode_workers} decode workers...")
+    # spawn, bukan fork: proses ini sudah punya thread (fetch pool, koneksi boto3) yang lock-nya bisa ikut terwarisi
+    mp_context = multiprocessing.get_context('spawn')
+    with ThreadPoolExecutor(max_workers=download_workers) as fetch_pool, \
+            ProcessPoolExecutor(max_workers=decode_workers, mp_context=mp_context) as decode_pool:
+        fetches = {fetch_pool.submit(_fetch, cfg, t.strftime('%Y%m%d%H%M000')): t for t in missing}
+        decodes = {}
+        for future in as_completed(fetches):
+            t = fetches[future]
+            t_str = t.strftime('%Y%m%d%H%M000')
+            try:
+                raw_file = future.result()
+            except Exception as e:
+                print(f"{t_str} download failed: {e}")
+                results[t] = e
+                continue
+            decodes[decode_pool.submit(decode_timestep, cfg, t_str, raw_file, missing[t])] = t
+
+        for future in as_completed(decodes):
+            t = decodes[future]
+            t_str = t.strftime('%Y%m%d%H%M000')
+            try:
+                results[t] = future.result()
+                print(f"{t_str} downloaded and converted.")
+            except Exception as e:
+                print(f"{t_str} conversion failed: {e}")
+                results[t] = e
+
+    return results
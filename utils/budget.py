@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+import time as _time
+from statistics import median
+
+_LOCK = threading.Lock()
+
+TIERS = ('full', 'reduced', 'extrapolation')
+# Biaya awal (detik per sel grid per member per lead time) sebelum ada riwayat run
+PRIOR_UNIT_COST = {'steps': 5e-7, 'extrapolation': 2e-8}
+
+
+class CostModel:
+    """Wall time of STEPS and extrapolation nowcasts, estimated from recorded runs.
+
+    Each run records its grid size, members, lead times, worker count and wall time in a JSON
+    history file. The cost per grid cell, member and lead time is the median of the last
+    ``window`` runs of the same method, so it follows the host (CPU, load, FFT backend) without
+    tuning. Until there is history ``PRIOR_UNIT_COST`` is used.
+    """
+
+    def __init__(self, history_file: str = None, max_records: int = 500, window: int = 20):
+        self.history_file = history_file
+        self.max_records = max_records
+        self.window = window
+        self.records = []
+        if history_file and os.path.isfile(history_file):
+            try:
+                with open(history_file, 'r') as f:
+                    self.records = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Could not read nowcast cost history {history_file}: {e}")
+
+    @staticmethod
+    def _parallel(members: int, workers: int) -> int:
+        return max(1, min(members, workers))
+
+    def unit_cost(self, method: str) -> float:
+        units = [r['wall_s'] * self._parallel(r['members'], r['workers']) / (r['pixels'] * r['members'] * r['leadtimes'])
+                 for r in self.records if r['method'] == method][-self.window:]
+        return median(units) if units else PRIOR_UNIT_COST[method]
+
+    def estimate(self, method: str, pixels: int, members: int, leadtimes: int, workers: int = 1) -> float:
+        return self.unit_cost(method) * pixels * members * leadtimes / self._parallel(members, workers)
+
+    def record(self, method: str, pixels: int, members: int, leadtimes: int, workers: int, wall_s: float):
+        entry = dict(method=method, pixels=pixels, members=members, leadtimes=leadtimes, workers=workers,
+                     wall_s=round(wall_s, 3), time=round(_time.time()))
+        with _LOCK:
+            self.records = (self.records + [entry])[-self.max_records:]
+            if not self.history_file:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.history_file)), exist_ok=True)
+            tmp_file = f"{self.history_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(self.records, f)
+            os.replace(tmp_file, self.history_file)
+
+
+_MODELS = {}
+
+
+def get_cost_model(cfg: dict) -> CostModel:
+    history_file = ((cfg.get('model_config') or {}).get('budget') or {}).get('history')
+    with _LOCK:
+        if history_file not in _MODELS:
+            _MODELS[history_file] = CostModel(history_file)
+        return _MODELS[history_file]
+
+
+def steps_memory_mb(pixels: int, members: int, leadtimes: int, ar_order: int = 1, n_cascade_levels: int = 6,
+                    streaming: bool = True) -> float:
+    """Rough peak memory of a STEPS run in MB (float64 cascades per member, plus the output cube without streaming)."""
+    per_member = 8 * pixels * (n_cascade_levels * (ar_order + 2) + 4)
+    shared = 8 * pixels * n_cascade_levels * (ar_order + 1)
+    output = 0 if streaming else 8 * pixels * members * leadtimes
+    return (shared + per_member * members + output) / 1e6
+
+
+def plan_nowcast(cfg: dict, shape: tuple, streaming: bool = True, now: float = None) -> dict:
+    """Pick the nowcast tier that fits the wall-clock deadline and memory budget.
+
+    ``full`` runs STEPS with ``n_ens_members``, ``reduced`` with as many members as fit (at least
+    ``budget.min_members``), ``extrapolation`` is the deterministic pysteps extrapolation
+    nowcast. The deadline is ``budget.deadline_seconds`` after ``cfg['cycle_start']`` (set by the
+    pipeline when the cycle starts, otherwise now), minus ``budget.reserve_seconds`` for
+    writing, rendering and publishing. Without ``budget.enabled`` the tier is always ``full``.
+    """
+    model_config = cfg['model_config']
+    budget_cfg = model_config.get('budget') or {}
+    members = model_config['n_ens_members']
+    plan = {'tier': 'full', 'method': model_config.get('method', 'steps'), 'n_ens_members': members}
+    if not budget_cfg.get('enabled', False) or plan['method'] != 'steps':
+        return plan
+
+    now = _time.time() if now is None else now
+    leadtimes = model_config['n_leadtimes']
+    pixels = int(shape[0]) * int(shape[1])
+    workers = model_config.get('num_workers', 1)
+    if workers in (0, 'auto'):
+        workers = os.cpu_count() or 1
+    model = get_cost_model(cfg)
+
+    deadline = cfg.get('cycle_start', now) + budget_cfg.get('deadline_seconds', 480)
+    remaining = deadline - now - budget_cfg.get('reserve_seconds', 30)
+    memory_mb = budget_cfg.get('memory_mb')
+    fits = lambda n: (model.estimate('steps', pixels, n, leadtimes, workers) <= remaining
+                      and (memory_mb is None or steps_memory_mb(pixels, n, leadtimes, model_config.get('ar_order', 1),
+                                                                streaming=streaming) <= memory_mb))
+
+    fitting = next((n for n in range(members, 0, -1) if fits(n)), 0)
+    if fitting == members:
+        n, tier = members, 'full'
+    elif fitting >= min(budget_cfg.get('min_members', 4), members):
+        n, tier = fitting, 'reduced'
+    else:
+        n, tier = 1, 'extrapolation'
+
+    method = 'extrapolation' if tier == 'extrapolation' else 'steps'
+    plan.update(tier=tier, method=method, n_ens_members=n, remaining_s=round(remaining, 1),
+                estimate_s=round(model.estimate(method, pixels, n, leadtimes, workers), 1))
+    if tier != 'full':
+        print(f"Nowcast budget: {remaining:.0f}s left, running tier '{tier}' with {n} member(s) "
+              f"instead of {members} (estimated {plan['estimate_s']}s).")
+    return plan
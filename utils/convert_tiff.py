@@ -1,5 +1,7 @@
 #!/home/metpublic/PYTHON_VENV/nowcasting_weather/bin/python
 import xarray
+import rioxarray  # registers the .rio accessor used by clip_domain
+import numpy as np
 from datetime import datetime, timedelta
 import json
 import yaml
@@ -7,8 +9,10 @@ import os
 import argparse
 try:
     from read_config import read_run_config
+    from grid_index import load_domain_index, domain_geodata
 except ModuleNotFoundError:
     from utils.read_config import read_run_config
+    from utils.grid_index import load_domain_index, domain_geodata
 
 def read_domain_dictionary(domain: os.PathLike | str) -> dict:
     try:
@@ -19,77 +23,147 @@ def read_domain_dictionary(domain: os.PathLike | str) -> dict:
     return domain_dict
 
 
-def convert_tiff(config: dict | str | os.PathLike, time: str = None):
-    print("Converting NetCDF to GeoTIFF...")
-
-    if isinstance(config, dict):
-        cfg = config
-    else:
-        cfg = read_run_config(config)
-
+def resolve_nc_path(cfg: dict, time: str = None) -> str:
     nc_dir = cfg.get('nc_dir')
     nc_filename = cfg.get('nc_filename_template')
-    tif_dir = cfg.get('tif_dir')
-    tif_filename = cfg.get('tif_filename_template')
-    domain = cfg.get('domain', 'Indonesia')
     nc_latest_file_info = cfg.get('nc_latest_file_info')
 
-    domain_info = cfg.get("domain_info")
-    domain_dict = read_domain_dictionary(domain_info)
-    boundary = domain_dict.get(domain).get('boundary')
-
     if not time:
         try:
             with open(nc_latest_file_info) as f:
                 latest_file_available = json.load(f)
-                latest_file_path = latest_file_available.get('file_path')
+                return latest_file_available.get('file_path')
         except FileNotFoundError:
             raise FileNotFoundError(f"Latest file info not found at {nc_latest_file_info}")
-    else:
-        try:
-            file_datestring = datetime.strptime(time, '%Y%m%d%H%M000').strftime('%Y%m%d%H%M000')
-        except ValueError:
-            file_datestring = datetime.strptime(time, '%Y%m%d%H%M').strftime('%Y%m%d%H%M000')
-        latest_file_path = f"{nc_dir}/{nc_filename.format(datestring=file_datestring)}"
 
-    print(f"Processing file: {latest_file_path}")
-    ds = xarray.open_dataset(latest_file_path, engine='netcdf4')
-    ds_clip = ds.sel(lat=slice(boundary[0], boundary[1]), lon=slice(boundary[2], boundary[3]))
+    try:
+        file_datestring = datetime.strptime(time, '%Y%m%d%H%M000').strftime('%Y%m%d%H%M000')
+    except ValueError:
+        file_datestring = datetime.strptime(time, '%Y%m%d%H%M').strftime('%Y%m%d%H%M000')
+    return f"{nc_dir}/{nc_filename.format(datestring=file_datestring)}"
+
+
+def clip_domain(ds: xarray.Dataset, entry: dict) -> xarray.DataArray:
+    # Potong langsung dengan indeks baris/kolom dari domain index
+    row_start, row_stop = entry['rows']
+    col_start, col_stop = entry['cols']
+    ds_clip = ds.isel(lat=slice(row_start, row_stop), lon=slice(col_start, col_stop))
     sliced = ds_clip['RRQPE'].squeeze()
     sliced = sliced.rio.write_crs("EPSG:4326")
     sliced = sliced.rio.set_spatial_dims(x_dim="lon", y_dim="lat", inplace=True)
 
     # Write some attributes
-    print("Writing attributes...")
     sliced.attrs['time_coverage_start'] = ds_clip.attrs['time_coverage_start']
     sliced.attrs['time_coverage_end'] = ds_clip.attrs['time_coverage_end']
-    sliced.attrs['geospatial_lat_min'] = round(float(ds_clip.lat.min()), 2)
-    sliced.attrs['geospatial_lat_max'] = round(float(ds_clip.lat.max()), 2)
-    sliced.attrs['geospatial_lon_min'] = round(float(ds_clip.lon.min()), 2)
-    sliced.attrs['geospatial_lon_max'] = round(float(ds_clip.lon.max()), 2)
+    sliced.attrs['geospatial_lat_min'] = round(entry['lat_min'], 2)
+    sliced.attrs['geospatial_lat_max'] = round(entry['lat_max'], 2)
+    sliced.attrs['geospatial_lon_min'] = round(entry['lon_min'], 2)
+    sliced.attrs['geospatial_lon_max'] = round(entry['lon_max'], 2)
     sliced.attrs['geospatial_lat_units'] = 'degrees_north'
     sliced.attrs['geospatial_lon_units'] = 'degrees_east'
     sliced.attrs['geospatial_lat_resolution'] = ds_clip.attrs.get('geospatial_lat_resolution')
     sliced.attrs['geospatial_lon_resolution'] = ds_clip.attrs.get('geospatial_lon_resolution')
+    return sliced
+
+
+def convert_tiff_domains(config: dict | str | os.PathLike, time: str = None, domains: list[str] = None) -> dict:
+    """Clip every domain in ``domains`` from one opened SCaMPR file and save each as GeoTIFF.
+
+    The NetCDF is opened and loaded into memory once, so adding domains only adds array slices
+    and GeoTIFF writes. Windows come from the cached domain index (see ``grid_index``).
+    Returns a dict of domain to written GeoTIFF path.
+    """
+    print("Converting NetCDF to GeoTIFF...")
 
-    # Save to GeoTIFF
-    print("Saving to GeoTIFF...")
+    if isinstance(config, dict):
+        cfg = config
+    else:
+        cfg = read_run_config(config)
+
+    tif_dir = cfg.get('tif_dir')
+    tif_filename = cfg.get('tif_filename_template')
+    if not domains:
+        domains = [cfg.get('domain', 'Indonesia')]
+
+    latest_file_path = resolve_nc_path(cfg, time)
+
+    print(f"Processing file: {latest_file_path}")
+    with xarray.open_dataset(latest_file_path, engine='netcdf4') as ds:
+        ds = ds.load()
     file_datestring = datetime.strptime(ds.attrs['time_coverage_start'], "%Y-%m-%dT%H:%M:%SZ").strftime("%Y%m%d%H%M000")
-    filename = tif_filename.format(domain=domain.lower(), datestring=file_datestring)
-    tif_dir = tif_dir.format(domain=domain.lower())
-    os.makedirs(tif_dir, exist_ok=True)
-    tif_file = f"{tif_dir}/{filename}"
-    sliced.rio.to_raster(tif_file, compression='LZW', dtype='float32')
-    print(f"GeoTIFF saved to: {tif_file}")
+    domain_index = load_domain_index(cfg, ds.lat.values, ds.lon.values)
+
+    tif_files = {}
+    for domain in domains:
+        if domain not in domain_index:
+            raise ValueError(f"Domain {domain} not found in domain index, check {cfg.get('domain_info')}")
+        print(f"Clipping domain {domain} and writing attributes...")
+        sliced = clip_domain(ds, domain_index[domain])
+
+        # Save to GeoTIFF
+        filename = tif_filename.format(domain=domain.lower(), datestring=file_datestring)
+        domain_tif_dir = tif_dir.format(domain=domain.lower())
+        os.makedirs(domain_tif_dir, exist_ok=True)
+        tif_file = f"{domain_tif_dir}/{filename}"
+        sliced.rio.to_raster(tif_file, compression='LZW', dtype='float32')
+        print(f"GeoTIFF saved to: {tif_file}")
+        tif_files[domain] = tif_file
+
+    return tif_files
+
+
+def clip_frames(config: dict | str | os.PathLike, time: str = None, domains: list[str] = None) -> tuple[str, dict]:
+    """Clip every domain from one opened SCaMPR file and return the frames instead of GeoTIFFs.
+
+    Used by the observation cube store. Returns the file datestring and a dict of domain to
+    ``(frame, geodata)`` with float32 frames.
+    """
+    if isinstance(config, dict):
+        cfg = config
+    else:
+        cfg = read_run_config(config)
+
+    if not domains:
+        domains = [cfg.get('domain', 'Indonesia')]
+
+    latest_file_path = resolve_nc_path(cfg, time)
+    print(f"Processing file: {latest_file_path}")
+    with xarray.open_dataset(latest_file_path, engine='netcdf4') as ds:
+        rr = ds['RRQPE'].squeeze().values.astype('float32')
+        file_datestring = datetime.strptime(ds.attrs['time_coverage_start'], "%Y-%m-%dT%H:%M:%SZ").strftime("%Y%m%d%H%M000")
+        domain_index = load_domain_index(cfg, ds.lat.values, ds.lon.values)
+
+    frames = {}
+    for domain in domains:
+        if domain not in domain_index:
+            raise ValueError(f"Domain {domain} not found in domain index, check {cfg.get('domain_info')}")
+        entry = domain_index[domain]
+        frame = rr[entry['rows'][0]:entry['rows'][1], entry['cols'][0]:entry['cols'][1]]
+        frames[domain] = (np.ascontiguousarray(frame), domain_geodata(entry))
+    return file_datestring, frames
+
+
+def convert_tiff(config: dict | str | os.PathLike, time: str = None):
+    if isinstance(config, dict):
+        cfg = config
+    else:
+        cfg = read_run_config(config)
+
+    domain = cfg.get('domain', 'Indonesia')
+    return convert_tiff_domains(cfg, time, [domain])[domain]
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Convert NetCDF to GeoTIFF")
     parser.add_argument('-c', '--config', type=str, required=True, help='Path to the configuration YAML file')
     parser.add_argument('-t', '--time', type=str, help='Optional time string in YYYYMMDDHHMM format')
+    parser.add_argument('-d', '--domains', type=str, default=None,
+                        help='Optional comma-separated list of domains to clip from the same file')
     args = parser.parse_args()
 
-    if args.time:
+    if args.domains:
+        convert_tiff_domains(args.config, args.time, args.domains.split(','))
+    elif args.time:
         convert_tiff(args.config, args.time)
     else:
         convert_tiff(args.config)
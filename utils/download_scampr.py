@@ -2,24 +2,26 @@
 import os
 try:
     from read_config import read_run_config
+    from s3_index import get_listing_index, get_s3_client
+    from s3_transfer import download_object
+    from grid_index import index_range, axis_coords
 except ModuleNotFoundError:
     from utils.read_config import read_run_config
+    from utils.s3_index import get_listing_index, get_s3_client
+    from utils.s3_transfer import download_object
+    from utils.grid_index import index_range, axis_coords
 
 import argparse
-import boto3
 import yaml
 import json
-from botocore import UNSIGNED
-from botocore.config import Config
 
 from datetime import datetime, timedelta
 from datetime import UTC
-import io
 import xarray as xr
-import numpy as np
 
 
 def transform_data(data, clip=None):
+    # Dibuka lazy: hanya metadata yang dibaca di sini
     ds = xr.open_dataset(data, engine='h5netcdf')
     # Original dimension
     nrows = ds.sizes["Rows"]  # atau "row"
@@ -31,9 +33,20 @@ def transform_data(data, clip=None):
     lon_min = float(ds.geospatial_lon_min)
     lon_max = float(ds.geospatial_lon_max)
 
+    # Tentukan rentang baris/kolom dari atribut grid, lalu baca hanya hyperslab tersebut
+    if clip:
+        north, south, west, east = clip
+        row_start, row_stop = index_range(lat_max, lat_min, nrows, south, north)  # north → south
+        col_start, col_stop = index_range(lon_min, lon_max, ncols, west, east)
+        # Semua variabel ikut dipotong dengan hyperslab yang sama, tetap lazy
+        ds = ds.isel(Rows=slice(row_start, row_stop), Columns=slice(col_start, col_stop))
+    else:
+        row_start, row_stop = 0, nrows
+        col_start, col_stop = 0, ncols
+
     # generate grids coordinates
-    lats = np.linspace(lat_max, lat_min, nrows)  # north → south
-    lons = np.linspace(lon_min, lon_max, ncols)
+    lats = axis_coords(lat_max, lat_min, nrows, row_start, row_stop)  # north → south
+    lons = axis_coords(lon_min, lon_max, ncols, col_start, col_stop)
 
     # Assign koordinat
     ds = ds.assign_coords(
@@ -57,29 +70,18 @@ def transform_data(data, clip=None):
     }
 
     if clip:
-        north, south, west, east = clip
-        ds_clip = ds.sel(
-            lon=slice(west, east),
-            lat=slice(north, south))
-        ds_clip.attrs = ds.attrs.copy()
+        ds.attrs['geospatial_lat_min'] = float(lats.min())
+        ds.attrs['geospatial_lat_max'] = float(lats.max())
+        ds.attrs['geospatial_lon_min'] = float(lons.min())
+        ds.attrs['geospatial_lon_max'] = float(lons.max())
 
-        ds_clip.attrs['geospatial_lat_min'] = float(ds_clip.lat.min())
-        ds_clip.attrs['geospatial_lat_max'] = float(ds_clip.lat.max())
-        ds_clip.attrs['geospatial_lon_min'] = float(ds_clip.lon.min())
-        ds_clip.attrs['geospatial_lon_max'] = float(ds_clip.lon.max())
-        return ds_clip
+    return ds
 
-    else:
-        return ds
-
-
-def get_latest_file(bucket, prefixes, substring:str|list="GLB-5"):
-    s3 = boto3.client("s3", config=Config(signature_version=UNSIGNED))
 
+def get_latest_file(index, prefixes, substring:str|list="GLB-5"):
     for prefix in prefixes:
         print(f"Looking for data at {prefix}")
-        response = s3.list_objects_v2(Bucket=bucket, Prefix=prefix)
-        contents = response.get("Contents", [])
+        contents = index.list(prefix)
         if not contents:
             continue  # coba prefix berikutnya
 
@@ -96,7 +98,25 @@ def get_latest_file(bucket, prefixes, substring:str|list="GLB-5"):
     return None
 
 
-def download_scampr(config: dict| str | os.PathLike, time: str = None):
+def local_complete(local_file: str) -> bool:
+    # File lokal di bawah 700KB dianggap rusak dan di-download ulang
+    if not os.path.isfile(local_file):
+        print(f"File not found: {local_file}, downloading...")
+        return False
+    file_size = os.path.getsize(local_file)
+    if file_size < 700 * 1024:
+        print(f"File size {file_size} bytes is less than 700KB, re-downloading...")
+        return False
+    print(f"File already exists: {local_file}, skipping download.")
+    return True
+
+
+def fetch_scampr(config: dict | str | os.PathLike, time: str = None):
+    """Find the requested SCaMPR object on S3 and download it to the raw directory.
+
+    Returns ``(key, raw_file)``. ``raw_file`` is ``None`` when a complete local file already exists;
+    for a given ``time`` with ``clip`` that is checked before S3 is listed, and ``key`` is ``None``.
+    """
     now = datetime.now(UTC)
     now = now.replace(minute=(now.minute // 10) * 10, second=0, microsecond=0)
     now_1 = now - timedelta(hours=1)
@@ -112,53 +132,66 @@ def download_scampr(config: dict| str | os.PathLike, time: str = None):
     prefix = cfg.get('prefix').format(datestring=now.strftime('%Y/%m/%d/%H'))
     prefix_1 = cfg.get('prefix').format(datestring=now_1.strftime('%Y/%m/%d/%H'))
     local_dir = cfg.get('nc_dir')
+    product = cfg.get('product', 'GLB-5')
+    index = get_listing_index(cfg)
+
+    download_cfg = cfg.get('download') or {}
+    raw_dir = download_cfg.get('raw_dir', os.path.join(local_dir, 'raw'))
+
+    # File clip untuk waktu tertentu sudah ada di nc_dir: tidak perlu listing S3
+    if time and clip:
+        local_file = os.path.join(local_dir, cfg.get('nc_filename_template').format(datestring=time))
+        if os.path.isfile(local_file) and local_complete(local_file):
+            return None, None
 
     if time:
         time_dt = datetime.strptime(time, "%Y%m%d%H%M000")
         prefix = cfg.get('prefix').format(datestring=time_dt.strftime('%Y/%m/%d/%H'))
-        latest_obj = get_latest_file(bucket_name, [prefix], [time,'GLB-5'])
+        latest_obj = get_latest_file(index, [prefix], [time, product])
     else:
         prefixes = [prefix, prefix_1]
-        latest_obj = get_latest_file(bucket_name, prefixes)
+        latest_obj = get_latest_file(index, prefixes, product)
 
-    if latest_obj:
-        print(f"Found requested time: {latest_obj['Key']}")
-        print(f"Processing data: {latest_obj['Key']}")
-        filename_aws = os.path.basename(latest_obj["Key"])
-        timestamp = filename_aws.split("_")[3][1:]
+    if not latest_obj:
+        raise FileNotFoundError("No matching files found")
 
-        if clip:
-            filename_check = cfg.get('nc_filename_template').format(datestring=timestamp)
-            local_file = os.path.join(local_dir, filename_check)
-        else:
-            local_file = os.path.join(local_dir, filename_aws)
-
-        s3 = boto3.client("s3", config=Config(signature_version=UNSIGNED))
-
-        # Cek apakah file lokal sudah ada
-        if os.path.isfile(local_file):
-            file_size = os.path.getsize(local_file)
-
-            # Jika file kecil, re-download
-            if file_size < 700 * 1024:
-                print(f"File size {file_size} bytes is less than 700KB, re-downloading...")
-                obj = s3.get_object(Bucket=bucket_name, Key=latest_obj["Key"])
-                data = io.BytesIO(obj["Body"].read())
-            else:
-                print(f"File already exists: {local_file}, skipping download.")
-                return
-        else:
-            # File belum ada, download
-            print(f"File not found: {local_file}, downloading...")
-            obj = s3.get_object(Bucket=bucket_name, Key=latest_obj["Key"])
-            data = io.BytesIO(obj["Body"].read())
+    print(f"Found requested time: {latest_obj['Key']}")
+    print(f"Processing data: {latest_obj['Key']}")
+    filename_aws = os.path.basename(latest_obj["Key"])
+    timestamp = filename_aws.split("_")[3][1:]
 
+    if clip:
+        filename_check = cfg.get('nc_filename_template').format(datestring=timestamp)
+        local_file = os.path.join(local_dir, filename_check)
     else:
-        raise FileNotFoundError("No matching files found")
+        local_file = os.path.join(local_dir, filename_aws)
+
+    # Cek apakah file lokal sudah ada
+    if local_complete(local_file):
+        return latest_obj["Key"], None
+
+    s3 = get_s3_client(cfg.get('s3_endpoint_url'), cfg.get('s3_max_pool_connections', 32))
+    raw_file = download_object(
+        s3, bucket_name, latest_obj["Key"], os.path.join(raw_dir, filename_aws),
+        part_size=int(download_cfg.get('part_size_mb', 8)) * 1024 * 1024,
+        max_workers=download_cfg.get('max_workers', 8),
+        retries=download_cfg.get('retries', 3),
+    )
+    return latest_obj["Key"], raw_file
+
+
+def save_scampr(config: dict | str | os.PathLike, raw_file: str, time: str = None) -> str:
+    """Decode a downloaded SCaMPR file, clip it and save it as NetCDF. Returns the output path."""
+    if isinstance(config, dict):
+        cfg = config
+    else:
+        cfg = read_run_config(config)
 
+    clip = cfg.get('clip')
+    local_dir = cfg.get('nc_dir')
 
     print("Transforming data to xarray dataset")
-    ds = transform_data(data, clip)
+    ds = transform_data(raw_file, clip)
 
     print("Saving to netcdf")
     file_datestring = datetime.strptime(ds.attrs['time_coverage_start'], "%Y-%m-%dT%H:%M:%SZ").strftime("%Y%m%d%H%M000")
@@ -167,6 +200,11 @@ def download_scampr(config: dict| str | os.PathLike, time: str = None):
     os.makedirs(local_dir, exist_ok=True)
     output_file = os.path.join(local_dir, filename)
     ds.to_netcdf(output_file, format='NETCDF4', engine='netcdf4')
+    ds.close()
+
+    # File mentah global tidak diperlukan lagi setelah di-clip
+    if not (cfg.get('download') or {}).get('keep_raw', False):
+        os.remove(raw_file)
 
     if not time:
         print("Writing latest_file_available.json")
@@ -179,6 +217,20 @@ def download_scampr(config: dict| str | os.PathLike, time: str = None):
         with open(latest_file, 'w') as f:
             json.dump(latest_info, f, indent=4)
 
+    return output_file
+
+
+def download_scampr(config: dict| str | os.PathLike, time: str = None):
+    if isinstance(config, dict):
+        cfg = config
+    else:
+        cfg = read_run_config(config)
+
+    key, raw_file = fetch_scampr(cfg, time)
+    if raw_file is None:
+        return
+    save_scampr(cfg, raw_file, time)
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Download SCaMPR data from AWS S3")
@@ -0,0 +1,112 @@
+import numpy as np
+import xarray as xr
+from pysteps.utils import transformation
+
+DESCRIPTION = "Processed output from nowcasting ensemble, the output is transformed back to rain rate (mm/h)."
+
+
+def prob_name(threshold: float) -> str:
+    return f"prob_{threshold:g}mm".replace('.', 'p')
+
+
+def percentile_name(q: float) -> str:
+    return f"p{q:g}_rr".replace('.', 'p')
+
+
+def ensemble_products(rr: np.ndarray, thresholds=(1.0,), percentiles=()) -> dict[str, np.ndarray]:
+    """Ensemble mean, exceedance probabilities and percentiles over the member axis (axis 0) of ``rr``.
+
+    The members are sorted once and every product is taken from the sorted stack: the mean and
+    percentiles ignore NaN members (as ``nanmean``/``nanpercentile`` with linear interpolation) and
+    the probabilities are the share of all members at or above each threshold, as uint8 percent.
+    Mean and percentiles keep the floating point dtype of ``rr``.
+    """
+    n_members = rr.shape[0]
+    # NaN diurutkan ke belakang, sehingga n_valid anggota pertama adalah nilai valid
+    members = np.sort(rr, axis=0)
+    valid = ~np.isnan(members)
+    n_valid = valid.sum(axis=0)
+
+    products = {}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        products['mean_rr'] = np.where(valid, members, 0.0).sum(axis=0) / n_valid.astype(members.dtype)
+
+    # Satu threshold per iterasi: mask boolean hanya seukuran members, bukan thresholds x members
+    for threshold in thresholds:
+        counts = (members >= members.dtype.type(threshold)).sum(axis=0)
+        products[prob_name(threshold)] = np.rint(counts * (100.0 / n_members)).astype('uint8')
+
+    if len(percentiles):
+        last = np.maximum(n_valid - 1, 0)
+        pos = (np.asarray(percentiles, dtype='float64') / 100).reshape(-1, *[1] * (members.ndim - 1)) * last
+        lo = np.floor(pos).astype('intp')
+        hi = np.minimum(lo + 1, last)
+        v_lo = np.take_along_axis(members, lo, axis=0)
+        v_hi = np.take_along_axis(members, hi, axis=0)
+        values = v_lo + (v_hi - v_lo) * (pos - lo).astype(members.dtype)
+        for q, v in zip(percentiles, values):
+            products[percentile_name(q)] = v
+    return products
+
+
+def ensemble_dataset(products: dict[str, np.ndarray], coords, thresholds=(1.0,), percentiles=(),
+                     dims=("time", "lat", "lon")) -> xr.Dataset:
+    data_vars = {
+        "mean_rr": xr.DataArray(products['mean_rr'], dims=dims, attrs={
+            "units": "mm/h",
+            "long_name": "Ensemble mean of rain rate"
+        })
+    }
+    for threshold in thresholds:
+        data_vars[prob_name(threshold)] = xr.DataArray(products[prob_name(threshold)], dims=dims, attrs={
+            "units": "%",
+            "long_name": f"Probability of exceeding {threshold:g}mm/h",
+            "threshold": float(threshold)
+        })
+    for q in percentiles:
+        data_vars[percentile_name(q)] = xr.DataArray(products[percentile_name(q)], dims=dims, attrs={
+            "units": "mm/h",
+            "long_name": f"Ensemble {q:g}th percentile of rain rate",
+            "percentile": float(q)
+        })
+    return xr.Dataset(data_vars, coords=coords, attrs={"description": DESCRIPTION})
+
+
+class EnsembleReducer:
+    """Streaming reduction of a STEPS ensemble, fed one lead time at a time.
+
+    Pass an instance as the pysteps ``callback`` together with ``return_output=False``. Each call
+    receives the ``(members, ny, nx)`` forecast of one lead time in dB, transforms it back to rain
+    rate and keeps only the products of :func:`ensemble_products`, so the
+    ``(members, leadtimes, ny, nx)`` cube is never allocated. With ``dtype`` each lead time is cast
+    to that dtype (e.g. float32) before the reduction.
+    """
+
+    def __init__(self, n_leadtimes: int, shape: tuple, n_members: int, thresholds=(1.0,), percentiles=(),
+                 db_threshold: float = -10.0, dtype=None):
+        self.n_leadtimes = n_leadtimes
+        self.shape = tuple(shape)
+        self.n_members = n_members
+        self.thresholds = list(thresholds)
+        self.percentiles = list(percentiles)
+        self.db_threshold = db_threshold
+        self.dtype = dtype
+        self.products = None
+        self.n_done = 0
+
+    def __call__(self, R_t: np.ndarray):
+        if self.dtype is not None:
+            R_t = R_t.astype(self.dtype, copy=False)
+        rr = transformation.dB_transform(R_t, threshold=self.db_threshold, inverse=True)[0]
+        products = ensemble_products(rr, self.thresholds, self.percentiles)
+        if self.products is None:
+            self.products = {name: np.empty((self.n_leadtimes, *self.shape), dtype=p.dtype)
+                             for name, p in products.items()}
+        for name, p in products.items():
+            self.products[name][self.n_done] = p
+        self.n_done += 1
+
+    def to_dataset(self, coords: dict) -> xr.Dataset:
+        if self.n_done != self.n_leadtimes:
+            raise RuntimeError(f"Ensemble reduction received {self.n_done} of {self.n_leadtimes} lead times")
+        return ensemble_dataset(self.products, coords, self.thresholds, self.percentiles)
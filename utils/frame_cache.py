@@ -0,0 +1,108 @@
+import fnmatch
+import glob
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+_CACHES = {}
+_LOCK = threading.Lock()
+
+
+def params_key(params: dict) -> str:
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+
+
+class FrameCache:
+    """LRU cache of preprocessed frames keyed by domain, timestamp and preprocessing parameters.
+
+    Entries are ``.npy`` files under ``cache_dir/{domain}/`` named after the frame time and a hash of
+    the parameters, so changing e.g. the dB threshold or zero value never returns stale frames.
+    The least recently used files (by mtime) are evicted once ``max_entries`` is exceeded. A
+    small in-memory layer avoids re-reading frames within the same process.
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = 600, memory_entries: int = 64):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, domain: str, time: datetime, params: dict) -> str:
+        return os.path.join(self.cache_dir, domain.lower(), f"{time:%Y%m%d%H%M}_{params_key(params)}.npy")
+
+    def get(self, domain: str, time: datetime, params: dict) -> np.ndarray | None:
+        path = self._path(domain, time, params)
+        with self._lock:
+            if path in self._memory:
+                self._memory.move_to_end(path)
+                return self._memory[path]
+        if not os.path.isfile(path):
+            return None
+        try:
+            frame = np.load(path)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        self._remember(path, frame)
+        return frame
+
+    def put(self, domain: str, time: datetime, params: dict, frame: np.ndarray):
+        path = self._path(domain, time, params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, 'wb') as f:
+            np.save(f, frame)
+        os.replace(tmp_file, path)
+        self._remember(path, frame)
+        self.evict()
+
+    def invalidate(self, domain: str, time: datetime):
+        # Hapus semua versi parameter untuk frame ini, misalnya setelah frame diunduh ulang
+        pattern = os.path.join(self.cache_dir, domain.lower(), f"{time:%Y%m%d%H%M}_*.npy")
+        with self._lock:
+            for path in [p for p in self._memory if fnmatch.fnmatch(p, pattern)]:
+                del self._memory[path]
+        for path in glob.glob(pattern):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def evict(self):
+        files = glob.glob(os.path.join(self.cache_dir, '*', '*.npy'))
+        if len(files) <= self.max_entries:
+            return
+        files.sort(key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+        for path in files[:len(files) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            with self._lock:
+                self._memory.pop(path, None)
+
+    def _remember(self, path: str, frame: np.ndarray):
+        with self._lock:
+            self._memory[path] = frame
+            self._memory.move_to_end(path)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+
+def get_frame_cache(cfg: dict) -> FrameCache | None:
+    """Return the process-wide frame cache configured in ``frame_cache``, or ``None`` if disabled."""
+    cache_cfg = cfg.get('frame_cache') or {}
+    if not cache_cfg.get('enabled', False):
+        return None
+    cache_dir = cache_cfg['dir']
+    with _LOCK:
+        if cache_dir not in _CACHES:
+            _CACHES[cache_dir] = FrameCache(cache_dir, cache_cfg.get('max_entries', 600),
+                                            cache_cfg.get('memory_entries', 64))
+        return _CACHES[cache_dir]
@@ -1,31 +1,38 @@
 import xarray as xr
-import matplotlib.pyplot as plt
-import cartopy.crs as ccrs
-from matplotlib.colors import ListedColormap, BoundaryNorm
+import numpy as np
 from datetime import datetime, timedelta
 import yaml
 import json
 import os
+import shutil
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 try:
     from read_config import read_run_config
+    from png_renderer import LEVELS, COLORS, TRANSPARENT, render_png, grid_bounds
+    from tiles import TILE_SIZE, render_tiles
+    from nc_encoding import NETCDF_LOCK
+    from instrument import stage, enabled as instrument_enabled
 except ModuleNotFoundError:
     from utils.read_config import read_run_config
+    from utils.png_renderer import LEVELS, COLORS, TRANSPARENT, render_png, grid_bounds
+    from utils.tiles import TILE_SIZE, render_tiles
+    from utils.nc_encoding import NETCDF_LOCK
+    from utils.instrument import stage, enabled as instrument_enabled
 
 
 def plot_data(da: xr.DataArray, output_file: str = None):
+    # matplotlib hanya diimpor untuk renderer lama
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import ListedColormap, BoundaryNorm
+
     data = da.fillna(0)
 
     vmin, vmax = float(data.min()), float(data.max())
     # contoh: gunakan level non-linear jika curah hujan
-    levels = [0.1, 1.0, 2.0, 5.0, 7.0, 9.0, 10, 12, 15, 20, 50, 100]
-    colors = [
-        "#0000c7", "#0079ff", "#32c8ff", "#78ebff",
-        "#ffffff", "#fff7c0", "#ffe500", "#ff7300",
-        "#ff3f00", "#c80000", "#960000", "#6e0000"
-    ]
-    colors = ["#ffffff00"] + colors
-    levels = [0.0] + levels
+    colors = [TRANSPARENT] + COLORS
+    levels = [0.0] + LEVELS
 
     # Buat colormap & normalization
     cmap = ListedColormap(colors)
@@ -61,7 +68,79 @@ def plot_data(da: xr.DataArray, output_file: str = None):
     plt.close()
 
 
-def generate_png_layer(config: os.PathLike | str | dict, obs_data: xr.DataArray = None):
+def render_layer(da: xr.DataArray, output_file: str, renderer: str = 'matplotlib', tile_dir: str = None,
+                 zooms: range = range(0)) -> tuple[str, dict]:
+    if os.path.isfile(output_file) and os.stat(output_file).st_nlink > 1:
+        # Hardlink ke layer kering di cache, jangan ditimpa di tempat
+        os.remove(output_file)
+    if renderer == 'lut':
+        render_png(da, output_file)
+    else:
+        plot_data(da, output_file)
+    tiles = render_tiles(da, tile_dir, zooms) if tile_dir else {}
+    return output_file, tiles
+
+
+def _render_shared(shm_name: str, shape: tuple, dtype: str, index: int, lat: np.ndarray, lon: np.ndarray,
+                   output_file: str, renderer: str, tile_dir: str, zooms: range) -> tuple[str, dict]:
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        values = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        da = xr.DataArray(values[index], coords={'lat': lat, 'lon': lon}, dims=('lat', 'lon'))
+        result = render_layer(da, output_file, renderer, tile_dir, zooms)
+        del values, da
+    finally:
+        shm.close()
+    return result
+
+
+def link_dry_layer(da: xr.DataArray, output_files: list[str], renderer: str = 'matplotlib', cache_dir: str = None,
+                   domain: str = '') -> list[str]:
+    """Write ``output_files`` as hardlinks (or copies) of one transparent layer.
+
+    The layer is rendered once per domain, renderer and grid shape into ``cache_dir`` and reused by
+    later dry runs. Without ``cache_dir`` the first output file is rendered and the others link to it.
+    """
+    if cache_dir:
+        source = os.path.join(cache_dir, f"{domain}_{renderer}_{da.shape[0]}x{da.shape[1]}.png")
+    else:
+        source = output_files[0]
+    if not os.path.isfile(source) or source == output_files[0]:
+        os.makedirs(os.path.dirname(source), exist_ok=True)
+        tmp_file = f"{source}.{os.getpid()}.tmp.png"
+        render_layer(da, tmp_file, renderer)
+        os.replace(tmp_file, source)
+
+    for output_file in output_files:
+        if output_file == source:
+            continue
+        if os.path.lexists(output_file):
+            os.remove(output_file)
+        try:
+            os.link(source, output_file)
+        except OSError:
+            # Filesystem berbeda atau tidak mendukung hardlink
+            shutil.copyfile(source, output_file)
+    return output_files
+
+
+def _layer_done(on_layer, png_storage_dir: str, result: tuple[str, dict], tile_dir: str = None):
+    if on_layer is None:
+        return
+    output_file, tiles = result
+    on_layer(output_file, os.path.relpath(output_file, png_storage_dir))
+    for z, zoom_tiles in tiles.items():
+        for tile in zoom_tiles:
+            tile_file = os.path.join(tile_dir, str(z), f"{tile}.png")
+            on_layer(tile_file, os.path.relpath(tile_file, png_storage_dir))
+
+
+def generate_png_layer(config: os.PathLike | str | dict, obs_data: xr.DataArray = None, on_layer=None):
+    """Render the PNG layers (and optional tiles) of the latest nowcast and write the latest png json.
+
+    ``on_layer(local_file, relpath)`` is called for every PNG as soon as its lead time is rendered,
+    with ``relpath`` relative to the PNG directory, so e.g. uploads can overlap with rendering.
+    """
     if isinstance(config, (str, os.PathLike)):
         cfg = read_run_config(config)
     elif isinstance(config, dict):
@@ -94,43 +173,112 @@ def generate_png_layer(config: os.PathLike | str | dict, obs_data: xr.DataArray
         'bounds':
             {'overlayTLC': [],'overlayBRC': []}, #top-left corner, bottom-right corner
         'legend':{
-            'levels':[0.1, 1.0, 2.0, 5.0, 7.0, 9.0, 10, 12, 15, 20, 50, 100],
-            'colors': ["#0000c7", "#0079ff", "#32c8ff", "#78ebff","#ffffff", "#fff7c0", "#ffe500", "#ff7300","#ff3f00", "#c80000", "#960000", "#6e0000"],
+            'levels': LEVELS,
+            'colors': COLORS,
             'units': 'mm/hr'
         }
     }
 
-    ds = xr.open_dataset(file_path, engine="netcdf4")
+    with NETCDF_LOCK:
+        with xr.open_dataset(file_path, engine="netcdf4") as ds:
+            ds = ds.load()
 
     local_time = cfg.get('local_time', 0)
     local_time_code = cfg.get('local_time_code', 'UTC')
+    # 'lut' menulis PNG langsung dari grid (1 piksel per sel), 'matplotlib' adalah renderer lama
+    renderer = cfg.get('png_renderer', 'matplotlib')
+    if renderer not in ('lut', 'matplotlib'):
+        raise ValueError(f"Invalid png_renderer: {renderer}. Must be 'lut' or 'matplotlib'.")
 
     var = 'mean_rr'
-    if 'time' in ds.dims:
-        times = ds['time'].values
-        for t in times:
-            ds_time = ds.sel(time=t)
-            data = ds_time[var]
-            leadtime = data.leadtime.values
-            timestamp = datetime.strptime(str(data.time.values), "%Y-%m-%dT%H:%M:%S.%f000")
-            timestamp_file = timestamp.strftime("%Y%m%d%H%M000")
-            os.makedirs(png_storage_dir, exist_ok=True)
-            output_file = f"scampr_steps_{domain}_base{base_time:%Y%m%d%H%M000}_valid{timestamp_file}_{leadtime}.png"
-            print("Generating:", output_file)
-            plot_data(data, os.path.join(png_storage_dir, output_file))
-            metadata_dict['timeUtc'].append(timestamp.strftime(f"%Y-%m-%d %H:%M UTC (+{leadtime:03d}min)"))
-            metadata_dict['timeLocal'].append((timestamp + timedelta(hours=local_time)).strftime(f"%Y-%m-%d %H:%M {local_time_code} (+{leadtime:03d}min)"))
-            metadata_dict['file'].append(output_file)
-
-    else:
+    if 'time' not in ds.dims:
         print("time dimension not found in dataset.")
         return
 
+    timestamps = ds.indexes['time'].to_pydatetime()
+    leadtimes = [int(lt) for lt in ds['leadtime'].values]
+    data = ds[var].transpose('time', 'lat', 'lon')
+    lat, lon = data['lat'].values, data['lon'].values
+
+    # Piramida tile XYZ (Web Mercator) opsional, tile kering tidak ditulis
+    tiles_cfg = cfg.get('tiles') or {}
+    zooms = range(0)
+    tile_root = None
+    if tiles_cfg.get('enabled', False):
+        zooms = range(tiles_cfg.get('min_zoom', 5), tiles_cfg.get('max_zoom', 9) + 1)
+        tile_root = tiles_cfg.get('dir') or os.path.join(png_storage_dir, 'tiles')
+        tile_root = tile_root.format(domain=domain, basetime=base_time.strftime('%Y%m%d%H%M'))
+
+    os.makedirs(png_storage_dir, exist_ok=True)
+    tasks = []
+    for i, (timestamp, leadtime) in enumerate(zip(timestamps, leadtimes)):
+        output_file = f"scampr_steps_{domain}_base{base_time:%Y%m%d%H%M000}_valid{timestamp:%Y%m%d%H%M000}_{leadtime}.png"
+        tile_dir = os.path.join(tile_root, str(leadtime)) if tile_root else None
+        tasks.append((i, os.path.join(png_storage_dir, output_file), tile_dir))
+        metadata_dict['timeUtc'].append(timestamp.strftime(f"%Y-%m-%d %H:%M UTC (+{leadtime:03d}min)"))
+        metadata_dict['timeLocal'].append((timestamp + timedelta(hours=local_time)).strftime(f"%Y-%m-%d %H:%M {local_time_code} (+{leadtime:03d}min)"))
+        metadata_dict['file'].append(output_file)
+
+    with stage(cfg, 'render', domain=domain, base_time=base_time) as record:
+        n_workers = min(cfg.get('png_workers', 1) or os.cpu_count() or 1, len(tasks))
+        if not np.any(data.values > 0):
+            # Nowcast kering: satu layer transparan dipakai untuk semua lead time
+            results = []
+            for output_file in link_dry_layer(data.isel(time=0), [t[1] for t in tasks], renderer,
+                                              cfg.get('dry_png_cache'), domain):
+                results.append((output_file, {}))
+                _layer_done(on_layer, png_storage_dir, results[-1])
+            print(f"No rain in the nowcast, linked {len(results)} transparent layers.")
+        elif n_workers > 1:
+            # mean_rr disalin sekali ke shared memory, worker hanya menerima nama blok dan indeks lead time
+            values = np.ascontiguousarray(data.values)
+            shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            try:
+                np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf)[:] = values
+                del values
+                with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                    futures = [executor.submit(_render_shared, shm.name, data.shape, data.dtype.str, i, lat, lon,
+                                               output_file, renderer, tile_dir, zooms)
+                               for i, output_file, tile_dir in tasks]
+                    results = []
+                    for future, (i, _, tile_dir) in zip(futures, tasks):
+                        results.append(future.result())
+                        print("Generated:", os.path.basename(results[-1][0]))
+                        _layer_done(on_layer, png_storage_dir, results[-1], tile_dir)
+            finally:
+                shm.close()
+                shm.unlink()
+        else:
+            results = []
+            for i, output_file, tile_dir in tasks:
+                print("Generating:", os.path.basename(output_file))
+                results.append(render_layer(data.isel(time=i), output_file, renderer, tile_dir, zooms))
+                _layer_done(on_layer, png_storage_dir, results[-1], tile_dir)
+        if instrument_enabled(cfg):
+            record['bytes_out'] += sum(os.path.getsize(output_file) for output_file, _ in results)
+            if tile_root:
+                record['bytes_out'] += sum(os.path.getsize(os.path.join(tile_root, str(leadtime), z, f"{tile}.png"))
+                                           for leadtime, (_, tiles) in zip(leadtimes, results)
+                                           for z, zoom_tiles in tiles.items() for tile in zoom_tiles)
+
+    if tile_root:
+        metadata_dict['tiles'] = {
+            'path': os.path.relpath(tile_root, png_storage_dir).replace(os.sep, '/'),
+            'urlTemplate': '{leadtime}/{z}/{x}/{y}.png',
+            'tileSize': TILE_SIZE,
+            'minZoom': zooms.start,
+            'maxZoom': zooms.stop - 1,
+            'layers': [{'leadtime': leadtime, 'tiles': tiles} for leadtime, (_, tiles) in zip(leadtimes, results)]
+        }
+
     # Simpan metadata
     print("Saving metadata...")
     metadata_dict['baseTimeUtc'] = base_time.strftime("%Y-%m-%d %H:%M UTC")
-    metadata_dict['bounds']['overlayTLC'] = [float(ds.lon.min()), float(ds.lat.max())]
-    metadata_dict['bounds']['overlayBRC'] = [float(ds.lon.max()), float(ds.lat.min())]
+    if renderer == 'lut':
+        metadata_dict['bounds'] = grid_bounds(ds[var])
+    else:
+        metadata_dict['bounds']['overlayTLC'] = [float(ds.lon.min()), float(ds.lat.max())]
+        metadata_dict['bounds']['overlayBRC'] = [float(ds.lon.max()), float(ds.lat.min())]
     # metadata_file = os.path.join(latest_png_info, f"scampr_steps_{domain}_latest.json")
     with open(latest_png_info.format(domain=domain), 'w') as f:
         json.dump(metadata_dict, f, indent=4)
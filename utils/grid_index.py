@@ -0,0 +1,189 @@
+import json
+import os
+
+import numpy as np
+import yaml
+
+
+def coord_window(coords: np.ndarray, a: float, b: float) -> tuple[int, int]:
+    """Return ``(start, stop)`` of the cells of a monotonic 1-D axis that fall inside ``[a, b]``.
+
+    Uses the same inclusive comparison as a label-based ``sel`` with a slice, so the windows
+    are identical to the ones the old ``ds.sel(lat=slice(...), lon=slice(...))`` produced.
+    """
+    lo, hi = min(a, b), max(a, b)
+    inside = np.nonzero((coords >= lo) & (coords <= hi))[0]
+    if inside.size == 0:
+        return 0, 0
+    return int(inside[0]), int(inside[-1]) + 1
+
+
+def index_range(first: float, last: float, n: int, a: float, b: float) -> tuple[int, int]:
+    """Window of ``[a, b]`` on the regular axis ``np.linspace(first, last, n)``.
+
+    Only the 1-D axis is generated, never the 2-D grid.
+    """
+    return coord_window(np.linspace(first, last, n), a, b)
+
+
+def axis_coords(first: float, last: float, n: int, start: int, stop: int) -> np.ndarray:
+    """Coordinates of cells ``start:stop`` of ``np.linspace(first, last, n)``."""
+    return np.linspace(first, last, n)[start:stop]
+
+
+_DOMAIN_INDEXES = {}
+
+
+def grid_signature(lat: np.ndarray, lon: np.ndarray) -> dict:
+    """Describe a regular lat/lon grid by its size and end points."""
+    return {
+        'nlat': int(lat.size), 'lat_first': round(float(lat[0]), 6), 'lat_last': round(float(lat[-1]), 6),
+        'nlon': int(lon.size), 'lon_first': round(float(lon[0]), 6), 'lon_last': round(float(lon[-1]), 6),
+    }
+
+
+def build_domain_index(domain_dict: dict, lat: np.ndarray, lon: np.ndarray) -> dict:
+    """Compute the integer row/column window of every domain on the ``lat``/``lon`` grid.
+
+    Each entry holds the ``rows`` and ``cols`` slices plus the cell-centre bounds and resolution
+    of the window, so callers can slice arrays and describe the result without touching coordinates.
+    """
+    lat_res = abs(float(lat[-1]) - float(lat[0])) / max(lat.size - 1, 1)
+    lon_res = abs(float(lon[-1]) - float(lon[0])) / max(lon.size - 1, 1)
+
+    index = {}
+    for domain, info in domain_dict.items():
+        north, south, west, east = info['boundary']
+        rows = coord_window(lat, south, north)
+        cols = coord_window(lon, west, east)
+        lats = lat[rows[0]:rows[1]]
+        lons = lon[cols[0]:cols[1]]
+        if lats.size == 0 or lons.size == 0:
+            print(f"Domain {domain} does not overlap the grid, skipped.")
+            continue
+        index[domain] = {
+            'rows': list(rows),
+            'cols': list(cols),
+            'lat_min': float(lats.min()), 'lat_max': float(lats.max()),
+            'lon_min': float(lons.min()), 'lon_max': float(lons.max()),
+            'lat_res': lat_res, 'lon_res': lon_res,
+        }
+    return index
+
+
+def domain_geodata(entry: dict) -> dict:
+    """Pysteps-style geodata (cell-edge bounds) for a domain index entry."""
+    return {
+        'projection': '+proj=longlat +datum=WGS84 +no_defs',
+        'x1': entry['lon_min'] - entry['lon_res'] / 2, 'y1': entry['lat_min'] - entry['lat_res'] / 2,
+        'x2': entry['lon_max'] + entry['lon_res'] / 2, 'y2': entry['lat_max'] + entry['lat_res'] / 2,
+        'yorigin': 'upper',
+    }
+
+
+def window_matches(entry: dict, shape: tuple, geodata: dict | None) -> bool:
+    """True if frames of ``shape`` and ``geodata`` were clipped with the window of index ``entry``."""
+    if tuple(shape) != (entry['rows'][1] - entry['rows'][0], entry['cols'][1] - entry['cols'][0]):
+        return False
+    if not geodata:
+        return True
+    expected = domain_geodata(entry)
+    tolerance = min(entry['lat_res'], entry['lon_res']) / 2
+    return all(abs(geodata[k] - expected[k]) < tolerance for k in ('x1', 'y1', 'x2', 'y2'))
+
+
+_TIF_WINDOWS = {}
+
+
+def read_tif_window(file_path: str) -> tuple[tuple, dict]:
+    """Shape and geodata of a GeoTIFF frame, memoised per file and modification time."""
+    # rasterio hanya dibutuhkan untuk input GeoTIFF
+    import rasterio
+
+    key = (file_path, os.path.getmtime(file_path))
+    if key not in _TIF_WINDOWS:
+        with rasterio.open(file_path) as ds:
+            _TIF_WINDOWS[key] = ((ds.height, ds.width), {
+                'projection': ds.crs.to_proj4(), 'x1': ds.bounds.left, 'y1': ds.bounds.bottom,
+                'x2': ds.bounds.right, 'y2': ds.bounds.top, 'yorigin': 'upper'})
+    return _TIF_WINDOWS[key]
+
+
+def mosaic_config(cfg: dict) -> dict | None:
+    mosaic_cfg = cfg.get('mosaic') or {}
+    return mosaic_cfg if mosaic_cfg.get('enabled', False) else None
+
+
+def mosaic_boundary(domain_dict: dict, domains: list[str] | str = 'all', halo: float = 0.0) -> list[float]:
+    """Bounding box ``[north, south, west, east]`` covering ``domains``, widened by ``halo`` degrees."""
+    if domains in (None, 'all'):
+        domains = list(domain_dict)
+    boundaries = np.array([domain_dict[d.lower()]['boundary'] for d in domains], dtype=float)
+    north, south = boundaries[:, 0].max() + halo, boundaries[:, 1].min() - halo
+    west, east = boundaries[:, 2].min() - halo, boundaries[:, 3].max() + halo
+    return [float(north), float(south), float(west), float(east)]
+
+
+def _mosaic_signature(cfg: dict) -> dict | None:
+    mosaic_cfg = mosaic_config(cfg)
+    if mosaic_cfg is None:
+        return None
+    return {'name': mosaic_cfg.get('name', 'mosaic'), 'domains': mosaic_cfg.get('domains', 'all'),
+            'halo_deg': mosaic_cfg.get('halo_deg', 0.0)}
+
+
+def load_domain_index(cfg: dict, lat: np.ndarray = None, lon: np.ndarray = None) -> dict:
+    """Return the per-domain window index, building and caching it on disk when needed.
+
+    The cache (``domain_index_file``) is reused as long as the signature of the ``lat``/``lon``
+    grid and the modification time of ``domain_info`` still match. Without coordinates the cached
+    grid is trusted as is (and used to rebuild the index when ``domain_info`` or the mosaic changed).
+    Results are also memoised per process. With ``mosaic.enabled`` the index also holds the
+    mosaic region (``mosaic.name``) covering ``mosaic.domains``.
+    """
+    grid = None if lat is None else grid_signature(lat, lon)
+    domain_info = cfg.get('domain_info')
+    cache_file = cfg.get('domain_index_file')
+    domain_mtime = os.path.getmtime(domain_info)
+    mosaic = _mosaic_signature(cfg)
+
+    key = (cache_file or domain_info, None if grid is None else tuple(sorted(grid.items())), json.dumps(mosaic))
+    cached = _DOMAIN_INDEXES.get(key)
+    if cached and cached['domain_mtime'] == domain_mtime:
+        return cached['domains']
+
+    if cache_file and os.path.isfile(cache_file):
+        try:
+            with open(cache_file, 'r') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            cached = None
+        if (cached and cached.get('domain_mtime') == domain_mtime and cached.get('mosaic') == mosaic
+                and (grid is None or cached.get('grid') == grid)):
+            _DOMAIN_INDEXES[key] = cached
+            return cached['domains']
+        if cached and grid is None and cached.get('grid'):
+            # domain_info atau region mosaic berubah: index dibangun ulang dari grid yang tersimpan
+            grid = cached['grid']
+            lat = np.linspace(grid['lat_first'], grid['lat_last'], grid['nlat'])
+            lon = np.linspace(grid['lon_first'], grid['lon_last'], grid['nlon'])
+
+    if grid is None:
+        raise FileNotFoundError(f"No valid domain index at {cache_file} and no grid coordinates to build one")
+
+    print("Building domain slice index...")
+    with open(domain_info, 'r') as f:
+        domain_dict = yaml.safe_load(f)
+    if mosaic:
+        domain_dict[mosaic['name']] = {'boundary': mosaic_boundary(domain_dict, mosaic['domains'], mosaic['halo_deg']),
+                                       'name': 'Mosaic'}
+    cached = {'grid': grid, 'domain_mtime': domain_mtime, 'mosaic': mosaic,
+              'domains': build_domain_index(domain_dict, lat, lon)}
+    if cache_file:
+        os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(cached, f, indent=4)
+        os.replace(tmp_file, cache_file)
+    _DOMAIN_INDEXES[key] = cached
+    return cached['domains']
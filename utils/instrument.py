@@ -0,0 +1,160 @@
+import cProfile
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time as _time
+from contextlib import contextmanager
+from datetime import datetime, UTC
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_LOCAL = threading.local()
+_LOCK = threading.Lock()
+_METRICS = {}
+
+PROMETHEUS_METRICS = [
+    ('wall_s', 'scampr_stage_wall_seconds', 'Wall time of the last run of a pipeline stage.'),
+    ('cpu_s', 'scampr_stage_cpu_seconds', 'CPU time of the thread that ran the last run of a stage.'),
+    ('process_cpu_s', 'scampr_stage_process_cpu_seconds',
+     'Process CPU time (all threads and reaped children) during the last run of a stage.'),
+    ('rss_mb', 'scampr_stage_rss_megabytes', 'Process RSS at the end of the last run of a stage.'),
+    ('rss_delta_mb', 'scampr_stage_rss_delta_megabytes', 'Change of process RSS during the last run of a stage.'),
+    ('rss_peak_mb', 'scampr_stage_rss_peak_megabytes',
+     'Process-lifetime peak RSS at the end of the last run of a stage.'),
+    ('bytes_in', 'scampr_stage_bytes_in', 'Bytes downloaded in the last run of a stage.'),
+    ('bytes_out', 'scampr_stage_bytes_out', 'Bytes written in the last run of a stage.'),
+    ('finished_at', 'scampr_stage_last_run_timestamp_seconds', 'Unix time the last run of a stage finished.'),
+    ('ok', 'scampr_stage_last_run_success', '1 if the last run of a stage succeeded.'),
+]
+
+
+def _cpu_time() -> float:
+    cpu = _time.process_time()
+    if resource is not None:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu += children.ru_utime + children.ru_stime
+    return cpu
+
+
+def _rss_mb() -> float | None:
+    # RSS saat ini dari /proc (Linux); ru_maxrss hanya memberi puncak sepanjang umur proses
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return round(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2, 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux melaporkan KB, macOS byte
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def enabled(cfg: dict) -> bool:
+    return bool(((cfg or {}).get('instrument') or {}).get('enabled', False))
+
+
+def current_tags() -> dict:
+    stack = getattr(_LOCAL, 'stack', None)
+    return dict(stack[-1]) if stack else {}
+
+
+@contextmanager
+def stage(cfg: dict, name: str, **tags):
+    """Record wall time, CPU time, RSS and bytes in/out of a pipeline stage.
+
+    No-op unless ``instrument.enabled``. ``cpu_s`` is the calling thread's CPU time, ``process_cpu_s``
+    that of the whole process. Tags are inherited from the enclosing stage in the same thread; add
+    transferred bytes to ``record['bytes_in']`` or ``record['bytes_out']`` of the yielded record.
+    """
+    inst_cfg = (cfg or {}).get('instrument') or {}
+    record = {'stage': name, 'bytes_in': 0, 'bytes_out': 0}
+    if not enabled(cfg):
+        yield record
+        return
+
+    tags = {**current_tags(), **{k: v for k, v in tags.items() if v is not None}}
+    for k, v in tags.items():
+        record[k] = v.strftime('%Y%m%d%H%M') if isinstance(v, datetime) else v
+
+    profiler = None
+    if inst_cfg.get('profile_stage') == name:
+        profiler = cProfile.Profile()
+
+    stack = _LOCAL.__dict__.setdefault('stack', [])
+    stack.append(tags)
+    start, cpu_start, thread_cpu_start = _time.perf_counter(), _cpu_time(), _time.thread_time()
+    rss_start = _rss_mb()
+    record['ok'] = 1
+    try:
+        if profiler:
+            profiler.enable()
+        yield record
+    except BaseException as e:
+        record['ok'] = 0
+        record['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+        stack.pop()
+        record['wall_s'] = round(_time.perf_counter() - start, 4)
+        record['cpu_s'] = round(_time.thread_time() - thread_cpu_start, 4)
+        record['process_cpu_s'] = round(_cpu_time() - cpu_start, 4)
+        rss = _rss_mb()
+        record['rss_mb'] = rss
+        record['rss_delta_mb'] = None if rss is None or rss_start is None else round(rss - rss_start, 1)
+        record['rss_peak_mb'] = _peak_rss_mb()
+        record['finished_at'] = round(_time.time(), 3)
+        record['pid'] = os.getpid()
+        _emit(inst_cfg, record, profiler)
+
+
+def _emit(inst_cfg: dict, record: dict, profiler: cProfile.Profile = None):
+    try:
+        if inst_cfg.get('jsonl'):
+            line = json.dumps(dict(record, time=datetime.fromtimestamp(record['finished_at'], UTC).isoformat()))
+            os.makedirs(os.path.dirname(os.path.abspath(inst_cfg['jsonl'])), exist_ok=True)
+            with _LOCK, open(inst_cfg['jsonl'], 'a') as f:
+                f.write(line + '\n')
+
+        # Worker process (decode, render) hanya menulis JSONL, textfile dimiliki proses utama
+        if inst_cfg.get('prometheus') and multiprocessing.parent_process() is None:
+            with _LOCK:
+                _METRICS[(record['stage'], record.get('domain', ''))] = record
+                write_prometheus(inst_cfg['prometheus'], _METRICS)
+
+        if profiler is not None:
+            profile_dir = (inst_cfg.get('profile_dir')
+                           or os.path.dirname(os.path.abspath(inst_cfg.get('jsonl') or '.')))
+            os.makedirs(profile_dir, exist_ok=True)
+            parts = (record['stage'], record.get('domain'), record.get('base_time'), record['pid'])
+            name = '_'.join(str(p) for p in parts if p)
+            profiler.dump_stats(os.path.join(profile_dir, f"{name}.prof"))
+    except OSError as e:
+        # Instrumentasi tidak boleh menghentikan pipeline
+        print(f"Instrumentation output failed: {e}")
+
+
+def write_prometheus(path: str, metrics: dict):
+    lines = []
+    for key, metric, help_text in PROMETHEUS_METRICS:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} gauge")
+        for (stage_name, domain), record in sorted(metrics.items()):
+            if record.get(key) is not None:
+                lines.append(f'{metric}{{stage="{stage_name}",domain="{domain}"}} {record[key]}')
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_file = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_file, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_file, path)
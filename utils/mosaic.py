@@ -0,0 +1,165 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import xarray as xr
+try:
+    from grid_index import load_domain_index, domain_geodata, mosaic_config
+    from run_nowcasting import (load_inputs, preprocess_frames, nowcast_frames, save_nowcast, forecast_coords,
+                                steps_kwargs)
+    from budget import plan_nowcast, get_cost_model
+    from instrument import stage
+except ModuleNotFoundError:
+    from utils.grid_index import load_domain_index, domain_geodata, mosaic_config
+    from utils.run_nowcasting import (load_inputs, preprocess_frames, nowcast_frames, save_nowcast, forecast_coords,
+                                      steps_kwargs)
+    from utils.budget import plan_nowcast, get_cost_model
+    from utils.instrument import stage
+
+
+def fft_size(n: int) -> int:
+    """Smallest 5-smooth number (2^a * 3^b * 5^c) not below ``n``, a fast FFT length."""
+    size = n
+    while True:
+        k = size
+        for p in (2, 3, 5):
+            while k % p == 0:
+                k //= p
+        if k == 1:
+            return size
+        size += 1
+
+
+def tile_windows(ny: int, nx: int, tiles: tuple = (1, 1), halo: int = 0) -> list[tuple[tuple, tuple]]:
+    """Split an ``ny`` x ``nx`` grid into ``tiles`` (rows, columns) sub-regions.
+
+    Returns ``(core, outer)`` windows as ``(row_start, row_stop, col_start, col_stop)``; ``outer`` is
+    the core widened by ``halo`` cells on each side (clipped to the grid) and is what gets nowcast.
+    """
+    rows = np.linspace(0, ny, max(1, tiles[0]) + 1).astype(int)
+    cols = np.linspace(0, nx, max(1, tiles[1]) + 1).astype(int)
+    windows = []
+    for r0, r1 in zip(rows[:-1], rows[1:]):
+        for c0, c1 in zip(cols[:-1], cols[1:]):
+            core = (int(r0), int(r1), int(c0), int(c1))
+            outer = (max(core[0] - halo, 0), min(core[1] + halo, ny), max(core[2] - halo, 0), min(core[3] + halo, nx))
+            windows.append((core, outer))
+    return windows
+
+
+def _nowcast_tile(cfg: dict, name: str, R: np.ndarray, frame_times: list[datetime], metadata: dict,
+                  processed_output: bool, plan: dict, fft_pad: bool, tile: int = 0) -> xr.Dataset:
+    ny, nx = R.shape[1:]
+    if tile:
+        # Seed berbeda per tile agar noise tile yang bersebelahan tidak berkorelasi
+        model_config = cfg['model_config']
+        cfg = dict(cfg, model_config=dict(model_config, seed=model_config.get('seed', 42) + tile))
+    if fft_pad:
+        # Ditambah ke ukuran FFT-friendly dengan nilai tanpa hujan, dipotong lagi setelah nowcast
+        zerovalue = cfg['model_config'].get('db_zerovalue', -15.0)
+        R = np.pad(R, ((0, 0), (0, fft_size(ny) - ny), (0, fft_size(nx) - nx)), constant_values=zerovalue)
+    ds = nowcast_frames(cfg, name, R, frame_times, metadata, processed_output, plan, record_cost=False)
+    return ds.isel(lat=slice(0, ny), lon=slice(0, nx))
+
+
+def stitch_tiles(tiles: list[xr.Dataset], windows: list[tuple[tuple, tuple]], ny: int, nx: int) -> dict:
+    # Hanya bagian inti tiap tile yang dipakai, halo dibuang
+    variables = {}
+    for var, da in tiles[0].data_vars.items():
+        shape = tuple(ny if dim == 'lat' else nx if dim == 'lon' else max(t.sizes[dim] for t in tiles)
+                      for dim in da.dims)
+        out = np.empty(shape, dtype=np.result_type(*[t[var].dtype for t in tiles]))
+        for tile, (core, outer) in zip(tiles, windows):
+            out[..., core[0]:core[1], core[2]:core[3]] = tile[var].values[
+                ..., core[0] - outer[0]:core[1] - outer[0], core[2] - outer[2]:core[3] - outer[2]]
+        variables[var] = (da.dims, out)
+    return variables
+
+
+def slice_domain(ds: xr.Dataset, mosaic_entry: dict, entry: dict, base_time: datetime, timestep: int) -> xr.Dataset:
+    """Cut a domain out of the mosaic nowcast, with the same coordinates a per-domain run would have."""
+    row_start = entry['rows'][0] - mosaic_entry['rows'][0]
+    col_start = entry['cols'][0] - mosaic_entry['cols'][0]
+    ny, nx = entry['rows'][1] - entry['rows'][0], entry['cols'][1] - entry['cols'][0]
+    sub = ds.isel(lat=slice(row_start, row_start + ny), lon=slice(col_start, col_start + nx))
+
+    geodata = domain_geodata(entry)
+    coords = forecast_coords(ds.sizes['time'], ny, nx, {'geodata': geodata}, base_time, timestep)
+    sub = sub.assign_coords(lat=coords['lat'], lon=coords['lon'])
+    if 'x1' in sub.attrs:
+        sub.attrs.update({k: round(geodata[k], 1) for k in ('x1', 'y1', 'x2', 'y2')})
+    return sub
+
+
+def run_mosaic_nowcast(cfg: dict, domains: list[str], tif_files: list[str] = None, times: list[datetime] = None,
+                       processed_output: bool = True) -> tuple[str, xr.Dataset, dict]:
+    """Nowcast the mosaic region once and cut the per-domain products from it.
+
+    The mosaic (``mosaic.name`` in the domain index) covers ``mosaic.domains`` plus ``halo_deg``.
+    It is nowcast whole or split into ``mosaic.tiles`` sub-regions that overlap by
+    ``tile_halo`` cells, run in ``mosaic.workers`` processes with the STEPS seed offset per tile;
+    only the tile cores are kept. Each (sub-)region is padded with dry cells to an FFT-friendly
+    size when ``fft_pad`` is set. The tier is planned and its cost recorded once for the whole
+    mosaic. The input frames must match the mosaic window of the domain index, which changes with
+    ``halo_deg`` and the domains (``ValueError`` otherwise). Returns the mosaic output file and
+    dataset, and a dict of domain to ``(output_file, dataset)``.
+    """
+    mosaic_cfg = mosaic_config(cfg) or {}
+    model_config = cfg['model_config']
+    name = mosaic_cfg.get('name', 'mosaic')
+    index = load_domain_index(cfg)
+    mosaic_entry = index[name]
+
+    frame_times, load_frames, metadata = load_inputs(cfg, name, tif_files, times)
+    base_time = frame_times[-1] + timedelta(minutes=10)
+    with stage(cfg, 'preprocess', domain=name, base_time=base_time):
+        R = preprocess_frames(cfg, name, frame_times, load_frames)
+
+    ny, nx = R.shape[1:]
+    rows, cols = mosaic_entry['rows'], mosaic_entry['cols']
+    if (ny, nx) != (rows[1] - rows[0], cols[1] - cols[0]):
+        # Domain dipotong dengan offset dari index, frame harus berasal dari window mosaic yang sama
+        raise ValueError(f"Input frames of mosaic {name} are {ny}x{nx}, the domain index window is "
+                         f"{rows} x {cols}; re-ingest the mosaic frames")
+    windows = tile_windows(ny, nx, tuple(mosaic_cfg.get('tiles', [1, 1])), int(mosaic_cfg.get('tile_halo', 0)))
+    streaming = processed_output and model_config.get('ensemble_reduction', 'full') == 'streaming'
+    plan = plan_nowcast(cfg, (ny, nx), streaming)
+    fft_pad = mosaic_cfg.get('fft_pad', True)
+    tasks = [(cfg, name if len(windows) == 1 else f"{name}_{i}", R[:, r0:r1, c0:c1], frame_times, metadata,
+              processed_output, plan, fft_pad, i) for i, (_, (r0, r1, c0, c1)) in enumerate(windows)]
+
+    workers = min(int(mosaic_cfg.get('workers', 1)) or os.cpu_count() or 1, len(tasks))
+    print(f"Mosaic {name}: {ny}x{nx} cells in {len(tasks)} region(s), {workers} worker(s), "
+          f"{len(domains)} domain(s) to cut.")
+    start = time.perf_counter()
+    with stage(cfg, 'mosaic', domain=name, base_time=base_time):
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                tiles = list(executor.map(_nowcast_tile, *zip(*tasks)))
+        else:
+            tiles = [_nowcast_tile(*task) for task in tasks]
+
+    reference = next((t for t in tiles if t.attrs.get('nowcast_tier') != 'dry'), tiles[0])
+    # Biaya dicatat sekali di proses utama, bukan oleh tiap proses tile
+    if reference.attrs.get('nowcast_tier') != 'dry' and (model_config.get('budget') or {}).get('history'):
+        get_cost_model(cfg).record(plan['method'], ny * nx, plan['n_ens_members'], model_config['n_leadtimes'],
+                                   steps_kwargs(model_config)['num_workers'], time.perf_counter() - start)
+    coords = forecast_coords(model_config['n_leadtimes'], ny, nx, metadata, base_time, model_config['timestep'])
+    variables = stitch_tiles(tiles, windows, ny, nx)
+    if any('member' in dims for dims, _ in variables.values()):
+        coords['member'] = [i + 1 for i in range(max(t.sizes.get('member', 1) for t in tiles))]
+    ds = xr.Dataset(variables, coords=coords, attrs=dict(reference.attrs))
+    output_file = save_nowcast(cfg, name, ds, base_time)
+
+    outputs = {}
+    for domain in domains:
+        entry = index.get(domain)
+        if (entry is None or entry['rows'][0] < mosaic_entry['rows'][0] or entry['rows'][1] > mosaic_entry['rows'][1]
+                or entry['cols'][0] < mosaic_entry['cols'][0] or entry['cols'][1] > mosaic_entry['cols'][1]):
+            print(f"Domain {domain} is not inside mosaic {name}, skipped.")
+            continue
+        sub = slice_domain(ds, mosaic_entry, entry, base_time, model_config['timestep'])
+        outputs[domain] = (save_nowcast(cfg, domain, sub, base_time), sub)
+    return output_file, ds, outputs
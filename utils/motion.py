@@ -0,0 +1,100 @@
+import glob
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+from pysteps.motion.lucaskanade import dense_lucaskanade
+
+MAX_VELOCITY = 100
+
+
+def _motion_file(motion_dir: str, domain: str, time: datetime) -> str:
+    return os.path.join(motion_dir, domain.lower(), f"{time:%Y%m%d%H%M}.npz")
+
+
+def load_motion(motion_dir: str, domain: str, time: datetime) -> tuple[np.ndarray, int] | None:
+    """Load the motion field stored for ``time``. Returns ``(V, updates_since_full)`` or ``None``."""
+    path = _motion_file(motion_dir, domain, time)
+    if not os.path.isfile(path):
+        return None
+    try:
+        with np.load(path) as f:
+            return f['V'], int(f['updates'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_motion(motion_dir: str, domain: str, time: datetime, V: np.ndarray, updates: int, keep: int = 6):
+    path = _motion_file(motion_dir, domain, time)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_file = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_file, V=V, updates=updates)
+    os.replace(tmp_file, path)
+
+    # Simpan hanya beberapa field terakhir per domain
+    files = sorted(glob.glob(os.path.join(motion_dir, domain.lower(), '*.npz')))
+    for old in files[:-keep]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+
+
+def clean_motion(V: np.ndarray) -> np.ndarray:
+    V[~np.isfinite(V)] = 0.0
+    V[V > MAX_VELOCITY] = MAX_VELOCITY
+    V[V < -MAX_VELOCITY] = -MAX_VELOCITY
+    return V
+
+
+def estimate_motion(cfg: dict, domain: str, R: np.ndarray, frame_times: list[datetime]) -> np.ndarray:
+    """Estimate the advection field for the input stack ``R``, reusing the previous cycle's field.
+
+    ``model_config.motion.mode`` selects the strategy:
+
+    - ``full``: dense Lucas-Kanade on the last ``n_input_frames`` frames (the original behaviour).
+    - ``reuse``: take the field of the previous cycle unchanged.
+    - ``warm``: track features on the newest frame pair only and blend with the previous field,
+      ``V = (1 - blend) * V_prev + blend * V_new``.
+
+    ``reuse`` and ``warm`` fall back to a full estimate when no field exists for the previous frame
+    time, when its shape differs, or after ``full_every`` incremental updates.
+    """
+    model_config = cfg.get('model_config')
+    motion_cfg = model_config.get('motion') or {}
+    mode = motion_cfg.get('mode', 'full')
+    motion_dir = motion_cfg.get('dir')
+    timestep = model_config.get('timestep', 10)
+
+    n_input_frames = min(model_config['n_input_frames'], R.shape[0])
+
+    previous = None
+    if mode != 'full' and motion_dir and len(frame_times) > 1:
+        prev_time = frame_times[-1] - timedelta(minutes=timestep)
+        previous = load_motion(motion_dir, domain, prev_time)
+        if previous is not None and previous[0].shape != (2, *R.shape[1:]):
+            previous = None
+        if previous is not None and previous[1] >= motion_cfg.get('full_every', 6):
+            print("Periodic full motion estimation.")
+            previous = None
+
+    if previous is None:
+        if mode != 'full':
+            print("No usable previous motion field, computing full motion field.")
+        V = clean_motion(dense_lucaskanade(R[-n_input_frames:, :, :]))
+        updates = 0
+    elif mode == 'reuse':
+        print("Reusing motion field from previous cycle.")
+        V, updates = previous[0].copy(), previous[1] + 1
+    elif mode == 'warm':
+        print("Warm-starting motion field from previous cycle.")
+        blend = motion_cfg.get('blend', 0.5)
+        V_new = clean_motion(dense_lucaskanade(R[-2:, :, :]))
+        V = clean_motion((1 - blend) * previous[0] + blend * V_new)
+        updates = previous[1] + 1
+    else:
+        raise ValueError(f"Invalid motion mode: {mode}. Must be 'full', 'reuse' or 'warm'.")
+
+    if motion_dir:
+        save_motion(motion_dir, domain, frame_times[-1], V, updates)
+    return V
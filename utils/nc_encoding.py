@@ -0,0 +1,59 @@
+import os
+import threading
+
+import numpy as np
+import xarray as xr
+
+# Rain rate packed as int16 with 0.01 mm/h resolution, values above RR_PACKED_MAX saturate
+RR_SCALE = 0.01
+RR_FILL = np.iinfo('int16').min
+RR_PACKED_MAX = np.iinfo('int16').max * RR_SCALE
+
+# Library netCDF4/HDF5 tidak thread-safe: semua baca/tulis NetCDF dalam satu proses lewat lock ini
+NETCDF_LOCK = threading.Lock()
+
+PROFILES = {
+    # Perilaku lama: zlib level 8 tanpa chunking eksplisit
+    'legacy': dict(zlib=True, complevel=8),
+    'fast': dict(zlib=True, complevel=1, shuffle=True),
+    'archive': dict(zlib=True, complevel=6, shuffle=True),
+    'packed': dict(zlib=True, complevel=1, shuffle=True),
+}
+
+
+def _chunks(da: xr.DataArray) -> tuple:
+    # Satu chunk per lead time (dan per member), sehingga satu layer dibaca tanpa membuka chunk lain
+    return tuple(n if dim in ('lat', 'lon') else 1 for dim, n in zip(da.dims, da.shape))
+
+
+def nc_encoding(ds: xr.Dataset, profile: str = 'legacy') -> dict:
+    """Per-variable NetCDF encoding for one of the ``PROFILES``.
+
+    All profiles except ``legacy`` chunk per lead time. ``packed`` stores floating point rain rates
+    as int16 (``RR_SCALE`` mm/h steps); integer variables such as the uint8 probabilities are
+    kept as they are.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Invalid NetCDF encoding profile: {profile}. Must be one of {', '.join(PROFILES)}.")
+
+    encoding = {}
+    for var, da in ds.data_vars.items():
+        enc = dict(PROFILES[profile])
+        if profile != 'legacy':
+            enc['chunksizes'] = _chunks(da)
+        if profile == 'packed' and np.issubdtype(da.dtype, np.floating):
+            enc.update(dtype='int16', scale_factor=RR_SCALE, add_offset=0.0, _FillValue=RR_FILL)
+        encoding[var] = enc
+    return encoding
+
+
+def write_netcdf(ds: xr.Dataset, path: str | os.PathLike, profile: str = 'legacy'):
+    encoding = nc_encoding(ds, profile)
+    if profile == 'packed':
+        # Nilai di atas batas int16 dipotong agar tidak overflow saat di-pack
+        ds = ds.copy()
+        for var, da in ds.data_vars.items():
+            if np.issubdtype(da.dtype, np.floating):
+                ds[var] = da.clip(max=RR_PACKED_MAX)
+    with NETCDF_LOCK:
+        ds.to_netcdf(path, format='NETCDF4', encoding=encoding, engine='netcdf4')
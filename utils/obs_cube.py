@@ -0,0 +1,145 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+TIME_FORMAT = '%Y%m%d%H%M000'
+
+_CUBES = {}
+_LOCK = threading.Lock()
+
+
+class ObservationCube:
+    """Append-only, memory-mapped stack of observation frames for one domain.
+
+    Frames live in ``{path}.dat`` as a raw ``(capacity, ny, nx)`` array and a small JSON header
+    (``{path}.json``) records shape, dtype, geodata and the time stored in each slot. New frames
+    are written in place into the next free slot. When the cube is full, or frames were appended
+    out of time order, the newest ``retention`` frames are compacted to the front in time order,
+    so the latest window is normally a contiguous slice that can be mapped without copying.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.header_file = f"{path}.json"
+        self.data_file = f"{path}.dat"
+        self._lock = threading.Lock()
+        with open(self.header_file, 'r') as f:
+            self.header = json.load(f)
+        self._slots = {t: i for i, t in enumerate(self.header['times'][:self.header['count']])}
+        self._data = np.memmap(self.data_file, dtype=self.header['dtype'], mode='r+',
+                               shape=(self.header['capacity'], *self.header['shape']))
+
+    @classmethod
+    def create(cls, path: str, shape: tuple, capacity: int, geodata: dict = None, dtype: str = 'float32'):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        data = np.memmap(f"{path}.dat", dtype=dtype, mode='w+', shape=(capacity, *shape))
+        data.flush()
+        del data
+        header = {'shape': list(shape), 'dtype': dtype, 'capacity': capacity, 'count': 0,
+                  'retention': capacity // 2, 'times': [], 'geodata': geodata}
+        _write_header(f"{path}.json", header)
+        return cls(path)
+
+    def close(self):
+        self._data.flush()
+        del self._data
+
+    @property
+    def geodata(self) -> dict:
+        return self.header.get('geodata')
+
+    @property
+    def shape(self) -> tuple:
+        return tuple(self.header['shape'])
+
+    def times(self) -> list[datetime]:
+        return sorted(datetime.strptime(t, TIME_FORMAT) for t in self._slots)
+
+    def has(self, time: datetime) -> bool:
+        return time.strftime(TIME_FORMAT) in self._slots
+
+    def append(self, time: datetime, frame: np.ndarray):
+        self.append_many([(time, frame)])
+
+    def append_many(self, frames: list[tuple[datetime, np.ndarray]]):
+        with self._lock:
+            out_of_order = False
+            for time, frame in sorted(frames, key=lambda x: x[0]):
+                if tuple(frame.shape) != self.shape:
+                    raise ValueError(f"Frame shape {frame.shape} does not match cube shape {self.shape}")
+                key = time.strftime(TIME_FORMAT)
+                if key in self._slots:
+                    self._data[self._slots[key]] = frame
+                    continue
+                if self.header['count'] == self.header['capacity']:
+                    self._compact(self.header['retention'])
+                count = self.header['count']
+                if count and key < self.header['times'][count - 1]:
+                    out_of_order = True
+                self._data[count] = frame
+                self.header['times'].append(key)
+                self.header['count'] = count + 1
+                self._slots[key] = count
+
+            if out_of_order:
+                self._compact(self.header['count'])
+            self._data.flush()
+            _write_header(self.header_file, self.header)
+
+    def _compact(self, keep_count: int):
+        # Simpan keep_count frame terbaru, urutkan berdasarkan waktu, tulis ulang ke awal
+        keep = sorted(self._slots)[-keep_count:]
+        frames = np.array(self._data[[self._slots[k] for k in keep]])
+        self._data[:len(keep)] = frames
+        self.header['times'] = keep
+        self.header['count'] = len(keep)
+        self._slots = {t: i for i, t in enumerate(keep)}
+
+    def window(self, times: list[datetime]) -> np.ndarray:
+        """Return the frames for ``times`` in order, as a memmap view when they are contiguous."""
+        keys = [t.strftime(TIME_FORMAT) for t in times]
+        missing = [k for k in keys if k not in self._slots]
+        if missing:
+            raise KeyError(f"Frames not in observation cube {self.path}: {missing}")
+        slots = [self._slots[k] for k in keys]
+        if slots == list(range(slots[0], slots[0] + len(slots))):
+            return self._data[slots[0]:slots[-1] + 1]
+        return self._data[slots]
+
+
+def _write_header(header_file: str, header: dict):
+    tmp_file = f"{header_file}.{os.getpid()}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(header, f, indent=4)
+    os.replace(tmp_file, header_file)
+
+
+def get_cube(cfg: dict, domain: str, shape: tuple = None, geodata: dict = None) -> ObservationCube | None:
+    """Open (or create, when ``shape`` is given) the observation cube of ``domain``.
+
+    Cubes are cached per process. Returns ``None`` if the cube does not exist and cannot be created.
+    """
+    store_cfg = cfg.get('obs_store') or {}
+    path = os.path.join(store_cfg['dir'].format(domain=domain.lower()), f"{domain.lower()}_obs")
+
+    with _LOCK:
+        cube = _CUBES.get(path)
+        if cube is None and os.path.isfile(f"{path}.json"):
+            cube = _CUBES[path] = ObservationCube(path)
+        if cube is not None and shape is not None and (cube.shape != tuple(shape)
+                                                       or geodata and cube.geodata and cube.geodata != geodata):
+            # Grid atau window domain berubah: buat ulang cube
+            print(f"Observation cube {path} does not match the domain window {tuple(shape)}. Recreating.")
+            cube.close()
+            cube = None
+        if cube is None and shape is not None:
+            capacity = store_cfg.get('capacity', 4 * cfg.get('prior_steps', 12))
+            cube = _CUBES[path] = ObservationCube.create(path, tuple(shape), capacity, geodata)
+    return cube
+
+
+def use_cube(cfg: dict) -> bool:
+    return (cfg.get('obs_store') or {}).get('type', 'tif') == 'cube'
@@ -0,0 +1,80 @@
+import struct
+import zlib
+
+import numpy as np
+import xarray as xr
+
+# Legenda rain rate (mm/h): warna ke-i dipakai untuk nilai >= LEVELS[i], di bawah LEVELS[0] transparan
+LEVELS = [0.1, 1.0, 2.0, 5.0, 7.0, 9.0, 10, 12, 15, 20, 50, 100]
+COLORS = [
+    "#0000c7", "#0079ff", "#32c8ff", "#78ebff",
+    "#ffffff", "#fff7c0", "#ffe500", "#ff7300",
+    "#ff3f00", "#c80000", "#960000", "#6e0000"
+]
+TRANSPARENT = "#ffffff00"
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def hex_to_rgba(color: str) -> tuple[int, int, int, int]:
+    color = color.lstrip('#')
+    if len(color) == 6:
+        color += 'ff'
+    return tuple(int(color[i:i + 2], 16) for i in range(0, 8, 2))
+
+
+# LUT 13 entri: indeks 0 transparan, indeks i adalah COLORS[i - 1]
+LUT = np.array([hex_to_rgba(c) for c in [TRANSPARENT] + COLORS], dtype='uint8')
+
+
+def color_index(data: np.ndarray, levels=LEVELS) -> np.ndarray:
+    """Map rain rate to LUT indices; NaN and values below the first level map to the transparent entry."""
+    return np.digitize(np.nan_to_num(data, nan=0.0), levels).astype('uint8')
+
+
+def _chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+
+def write_png(path: str, index: np.ndarray, lut: np.ndarray = LUT, compress_level: int = 6):
+    """Write a 2-D array of LUT indices as an 8-bit palette PNG with per-entry alpha (PLTE + tRNS)."""
+    ny, nx = index.shape
+    raw = np.zeros((ny, nx + 1), dtype='uint8')  # byte pertama tiap baris: filter type 0
+    raw[:, 1:] = index
+
+    header = struct.pack('>IIBBBBB', nx, ny, 8, 3, 0, 0, 0)
+    png = b''.join([
+        PNG_SIGNATURE,
+        _chunk(b'IHDR', header),
+        _chunk(b'PLTE', lut[:, :3].tobytes()),
+        _chunk(b'tRNS', lut[:, 3].tobytes()),
+        _chunk(b'IDAT', zlib.compress(raw.tobytes(), compress_level)),
+        _chunk(b'IEND', b''),
+    ])
+    with open(path, 'wb') as f:
+        f.write(png)
+
+
+def north_up(da: xr.DataArray) -> np.ndarray:
+    """Values of a (lat, lon) array with the northernmost row first and longitude increasing."""
+    da = da.transpose('lat', 'lon')
+    data = da.values
+    if da.lat.size > 1 and da.lat.values[0] < da.lat.values[-1]:
+        data = data[::-1]
+    if da.lon.size > 1 and da.lon.values[0] > da.lon.values[-1]:
+        data = data[:, ::-1]
+    return data
+
+
+def grid_bounds(da: xr.DataArray) -> dict:
+    """Overlay corners at the outer cell edges, one PNG pixel per grid cell."""
+    half_lon = abs(float(da.lon[1] - da.lon[0])) / 2 if da.lon.size > 1 else 0.0
+    half_lat = abs(float(da.lat[1] - da.lat[0])) / 2 if da.lat.size > 1 else 0.0
+    return {
+        'overlayTLC': [float(da.lon.min()) - half_lon, float(da.lat.max()) + half_lat],
+        'overlayBRC': [float(da.lon.max()) + half_lon, float(da.lat.min()) - half_lat],
+    }
+
+
+def render_png(da: xr.DataArray, output_file: str, compress_level: int = 6):
+    write_png(output_file, color_index(north_up(da)), compress_level=compress_level)
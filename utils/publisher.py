@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import posixpath
+import queue
+import threading
+import time as _time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from ftplib import FTP, all_errors, error_perm
+
+try:
+    from send_ftp import ensure_remote_dirs
+except ModuleNotFoundError:
+    from utils.send_ftp import ensure_remote_dirs
+
+_PUBLISHERS = {}
+_LOCK = threading.Lock()
+
+
+def file_digest(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def remote_path(*parts: str) -> str:
+    # Path FTP selalu absolut dengan '/', apa pun OS lokalnya
+    return '/' + posixpath.normpath(posixpath.join(*[p.replace(os.sep, '/') for p in parts])).strip('/')
+
+
+class FTPPool:
+    """Up to ``size`` logged-in FTP connections, reused across uploads and cycles.
+
+    Idle connections are checked with ``NOOP`` before reuse once they have been idle longer
+    than ``keepalive`` seconds; a connection that fails mid-transfer is dropped and the next
+    checkout opens a fresh one. Remote directories created through the pool are remembered, so
+    ``MKD`` is only sent once per directory.
+    """
+
+    def __init__(self, host: str, port: int = 21, user: str = 'anonymous', passwd: str = '', size: int = 4,
+                 timeout: float = 30, passive: bool = True, keepalive: float = 30):
+        self.host = host
+        self.port = int(port)
+        self.user = user
+        self.passwd = passwd
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self.passive = passive
+        self.keepalive = keepalive
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._dirs = set()
+        self._dirs_lock = threading.Lock()
+
+    def _connect(self) -> FTP:
+        ftp = FTP(timeout=self.timeout)
+        ftp.connect(self.host, self.port)
+        ftp.login(user=self.user, passwd=self.passwd)
+        ftp.set_pasv(self.passive)
+        return ftp
+
+    def _checkout(self) -> FTP:
+        try:
+            ftp, last_used = self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+        if _time.monotonic() - last_used > self.keepalive:
+            try:
+                ftp.voidcmd('NOOP')
+            except all_errors:
+                self._discard(ftp)
+                return self._connect()
+        return ftp
+
+    @staticmethod
+    def _discard(ftp: FTP):
+        try:
+            ftp.close()
+        except all_errors:
+            pass
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        ftp = None
+        try:
+            ftp = self._checkout()
+            yield ftp
+        except all_errors:
+            # Status koneksi tidak jelas setelah error, jangan dikembalikan ke pool
+            if ftp is not None:
+                self._discard(ftp)
+                ftp = None
+            raise
+        finally:
+            if ftp is not None:
+                self._idle.put((ftp, _time.monotonic()))
+            self._slots.release()
+
+    def ensure_dir(self, ftp: FTP, path: str):
+        with self._dirs_lock:
+            if path in self._dirs:
+                return
+        ensure_remote_dirs(ftp, path)
+        with self._dirs_lock:
+            self._dirs.add(path)
+
+    def upload(self, local_file: str, remote_file: str):
+        """Upload under a temporary name in the target directory, then rename it into place."""
+        remote_dir, name = posixpath.split(remote_file)
+        tmp_file = posixpath.join(remote_dir, f".{name}.part")
+        with self.connection() as ftp:
+            self.ensure_dir(ftp, remote_dir)
+            with open(local_file, 'rb') as f:
+                ftp.storbinary(f"STOR {tmp_file}", f)
+            try:
+                ftp.rename(tmp_file, remote_file)
+            except error_perm:
+                # Beberapa server (mis. IIS) menolak RNTO ke file yang sudah ada
+                ftp.delete(remote_file)
+                ftp.rename(tmp_file, remote_file)
+
+    def close(self):
+        while True:
+            try:
+                ftp, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                ftp.quit()
+            except all_errors:
+                self._discard(ftp)
+
+
+class Publisher:
+    """Publish pipeline outputs (NetCDF, PNG layers, status JSON) to an FTP server.
+
+    Uploads run in ``pool.size`` threads over an ``FTPPool``, so callers can keep submitting files
+    (e.g. lead times as they finish rendering) while earlier ones are transferred. A file is skipped
+    when the manifest (remote path -> size and sha256 of the last upload) shows it unchanged.
+    Each upload goes to a temporary name and is renamed into place, so clients never read a
+    partially written file.
+    """
+
+    def __init__(self, pool: FTPPool, remote_dir: str = '/', manifest_file: str = None):
+        self.pool = pool
+        self.remote_dir = remote_dir
+        self.manifest_file = manifest_file
+        self.manifest = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=pool.size, thread_name_prefix='ftp')
+        if manifest_file and os.path.isfile(manifest_file):
+            try:
+                with open(manifest_file, 'r') as f:
+                    self.manifest = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Could not read FTP manifest {manifest_file}: {e}. Starting with an empty manifest.")
+
+    def domain_dir(self, domain: str) -> str:
+        return remote_path(self.remote_dir.format(domain=domain.lower()))
+
+    def _publish(self, local_file: str, remote_file: str) -> int:
+        size = os.path.getsize(local_file)
+        digest = file_digest(local_file)
+        with self._lock:
+            entry = self.manifest.get(remote_file)
+        if entry and entry['size'] == size and entry['sha256'] == digest:
+            return 0
+        self.pool.upload(local_file, remote_file)
+        with self._lock:
+            self.manifest[remote_file] = {'size': size, 'sha256': digest}
+        return size
+
+    def submit(self, local_file: str, remote_file: str) -> Future:
+        """Queue ``local_file`` for upload to ``remote_file``. The future returns the bytes sent (0 if skipped)."""
+        future = self._executor.submit(self._publish, local_file, remote_path(remote_file))
+        future.paths = (local_file, remote_path(remote_file))
+        return future
+
+    def wait(self, futures: list[Future]) -> dict:
+        """Wait for ``futures``, report failures and save the manifest. Returns upload counts and bytes."""
+        summary = {'uploaded': 0, 'skipped': 0, 'failed': 0, 'bytes': 0}
+        for future in futures:
+            try:
+                sent = future.result()
+            except Exception as e:
+                print(f"Upload of '{future.paths[0]}' to '{future.paths[1]}' failed: {e}")
+                summary['failed'] += 1
+                continue
+            summary['uploaded' if sent else 'skipped'] += 1
+            summary['bytes'] += sent
+        self.save_manifest()
+        return summary
+
+    def save_manifest(self):
+        if not self.manifest_file:
+            return
+        with self._lock:
+            manifest = dict(self.manifest)
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifest_file)), exist_ok=True)
+        tmp_file = f"{self.manifest_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(tmp_file, self.manifest_file)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.save_manifest()
+        self.pool.close()
+
+
+def get_publisher(cfg: dict) -> Publisher | None:
+    """Return the process-wide Publisher for ``cfg['ftp']``, or None when publishing is disabled."""
+    ftp_cfg = cfg.get('ftp') or {}
+    if not ftp_cfg.get('enabled', False):
+        return None
+    key = (ftp_cfg.get('host'), ftp_cfg.get('port', 21), ftp_cfg.get('user', 'anonymous'), ftp_cfg.get('remote_dir', '/'))
+    with _LOCK:
+        publisher = _PUBLISHERS.get(key)
+        if publisher is None:
+            pool = FTPPool(ftp_cfg['host'], ftp_cfg.get('port', 21), ftp_cfg.get('user', 'anonymous'),
+                           ftp_cfg.get('passwd', ''), size=ftp_cfg.get('connections', 4),
+                           timeout=ftp_cfg.get('timeout', 30), passive=ftp_cfg.get('passive', True))
+            publisher = Publisher(pool, ftp_cfg.get('remote_dir', '/'), ftp_cfg.get('manifest'))
+            _PUBLISHERS[key] = publisher
+    return publisher
+
+
+def close_publishers():
+    """Wait for pending uploads and close every Publisher from ``get_publisher``; later calls open new ones."""
+    with _LOCK:
+        publishers = list(_PUBLISHERS.values())
+        _PUBLISHERS.clear()
+    for publisher in publishers:
+        publisher.close()
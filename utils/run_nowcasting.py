@@ -1,44 +1,63 @@
 from pysteps import nowcasts
-from pysteps.motion.lucaskanade import dense_lucaskanade
 from pysteps.utils import transformation
 
+import importlib.util
 import os
 import yaml
 import numpy as np
-import rasterio
 import json
+import time
 from datetime import datetime, UTC, timedelta
 import xarray as xr
 import argparse
 try:
     from read_config import read_run_config
+    from grid_index import load_domain_index, domain_geodata, window_matches, read_tif_window
+    from obs_cube import get_cube, use_cube
+    from frame_cache import get_frame_cache
+    from motion import estimate_motion
+    from ensemble import EnsembleReducer, ensemble_products, ensemble_dataset
+    from nc_encoding import write_netcdf
+    from instrument import stage
+    from budget import plan_nowcast, get_cost_model
 except ModuleNotFoundError:
     from utils.read_config import read_run_config
+    from utils.grid_index import load_domain_index, domain_geodata, window_matches, read_tif_window
+    from utils.obs_cube import get_cube, use_cube
+    from utils.frame_cache import get_frame_cache
+    from utils.motion import estimate_motion
+    from utils.ensemble import EnsembleReducer, ensemble_products, ensemble_dataset
+    from utils.nc_encoding import write_netcdf
+    from utils.instrument import stage
+    from utils.budget import plan_nowcast, get_cost_model
 
 DOMAIN_DICT = 'D:\\Projects\\scampr-nowcasting\\domain_boundary.yaml'
 LATEST_FILE_INFO = '/data/latest_file_available.json'
 TIF_FILE_LIST = 'D:\\Projects\\scampr-nowcasting\\data\\tif\\{domain}\\tif_file_list.json'
 
 
+def forecast_coords(n_leadtimes: int, ny: int, nx: int, metadata: dict, base_time: datetime, timestep: int) -> dict:
+    time_index = [base_time + timedelta(minutes=timestep * i) for i in range(1,n_leadtimes+1)]
+    leadtime_index = [timestep * i for i in range(1,n_leadtimes+1)]
+    return {
+        "time": time_index,
+        "leadtime": ("time", leadtime_index),
+        "lon": np.linspace(round(metadata['geodata']['x1'], 1), round(metadata['geodata']['x2'], 1), nx),
+        "lat": np.linspace(round(metadata['geodata']['y2'], 1), round(metadata['geodata']['y1'], 1), ny)
+    }
+
+
 def convert_to_dataset(data: np.ndarray, metadata: dict, base_time: datetime, timestep: int,
                        km_per_pixel: int | None) -> xr.Dataset:
     ens_index = [i + 1 for i in range(data.shape[0])]
-    time_index = [base_time + timedelta(minutes=timestep * i) for i in range(1,data.shape[1]+1)]
-    leadtime_index = [timestep * i for i in range(1,data.shape[1]+1)]
-    nx = data.shape[3]
-    ny = data.shape[2]
+    coords = forecast_coords(data.shape[1], data.shape[2], data.shape[3], metadata, base_time, timestep)
+    coords["member"] = ens_index
 
     ds = xr.Dataset(
         {
             "rr": (("member", "time", "lat", "lon"), data)
         },
-        coords={
-            "time": time_index,
-            "member": ens_index,
-            "leadtime": ("time", leadtime_index),
-            "lon": np.linspace(round(metadata['geodata']['x1'], 1), round(metadata['geodata']['x2'], 1), nx),
-            "lat": np.linspace(round(metadata['geodata']['y2'], 1), round(metadata['geodata']['y1'], 1), ny)
-        },
+        coords=coords,
         attrs={
             "projection": metadata['geodata']['projection'],
             "x1": round(metadata['geodata']['x1'], 1),
@@ -53,120 +72,273 @@ def convert_to_dataset(data: np.ndarray, metadata: dict, base_time: datetime, ti
     return ds
 
 
-def compute_ensemble(ds: xr.Dataset) -> xr.Dataset:
-    mean = ds['rr'].mean("member")
-    prob = (ds['rr'] >= 1.0).sum("member") / ds.member.size
-    mean.attrs = {
-        "units": "mm/h",
-        "long_name": "Ensemble mean of rain rate"
-    }
+def compute_ensemble(ds: xr.Dataset, thresholds=(1.0,), percentiles=()) -> xr.Dataset:
+    products = ensemble_products(ds['rr'].transpose("member", "time", "lat", "lon").values, thresholds, percentiles)
+    return ensemble_dataset(products, ds.coords.drop_dims('member'), thresholds, percentiles)
 
-    prob.attrs = {
-        "units": "1",
-        "long_name": "Probability of exceeding 1mm/h"
-    }
 
-    ds_ens = xr.Dataset(
-        {
-            "mean_rr": mean,
-            "prob_1mm": prob
-        },
-        coords=ds.coords.drop_dims('member'),
-        attrs={
-            "description": "Processed output from nowcasting ensemble, the output is transformed back to rain rate (mm/h).",
-        }
-    )
-    return ds_ens
+def read_tif_frames(tif_input_files: list[str]) -> np.ndarray:
+    # rasterio hanya dibutuhkan untuk input GeoTIFF, tidak untuk observation cube
+    import rasterio
 
+    R = []
+    for file_path in tif_input_files:
+        with rasterio.open(file_path) as ds:
+            R.append(ds.read(1))
+    return np.stack(R)
 
-def run_nowcasting(config: os.PathLike | str|dict, tif_files: None | os.PathLike | str | list[str] = TIF_FILE_LIST,
-                   processed_output=True) -> (str,xr.Dataset):
 
-    #identify config input type
-    if isinstance(config, dict):
-        cfg = config
-    else:
-        cfg = read_run_config(config)
+def nowcast_dtype(model_config: dict) -> np.dtype:
+    """Floating point dtype of the nowcast (``model_config.dtype``, float64 unless set)."""
+    dtype = np.dtype(model_config.get('dtype', 'float64'))
+    if dtype not in (np.float32, np.float64):
+        raise ValueError(f"Invalid nowcast dtype: {dtype}. Must be 'float32' or 'float64'.")
+    return dtype
 
-    domain = cfg.get('domain').lower()
+
+def preprocess_frames(cfg: dict, domain: str, frame_times: list[datetime], load_frames) -> np.ndarray:
+    """Return the dB-transformed input stack, reusing cached frames from previous runs.
+
+    ``load_frames(indices)`` must return the raw rain-rate frames at those positions; it is only
+    called for frames that are not in the frame cache, which is keyed on the transform parameters and
+    the domain index window. Frames wider than the nowcast dtype are cast down to it; narrower frames
+    (float32 GeoTIFFs under a float64 policy) are kept as read.
+    """
     model_config = cfg.get('model_config')
+    dtype = nowcast_dtype(model_config)
+    # Window grid ikut di-hash agar frame dari window lama tidak dipakai ulang
+    window = None
+    if cfg.get('domain_index_file'):
+        try:
+            entry = load_domain_index(cfg)[domain]
+            window = entry['rows'] + entry['cols']
+        except (FileNotFoundError, KeyError):
+            pass
+    db_params = {'threshold': model_config.get('db_threshold', 0.1), 'zerovalue': model_config.get('db_zerovalue', -15.0),
+                 'dtype': dtype.name, 'window': window}
+    cache = get_frame_cache(cfg)
+
+    frames = [cache.get(domain, t, db_params) if cache else None for t in frame_times]
+    missing = [i for i, frame in enumerate(frames) if frame is None]
+    if missing:
+        R_raw = load_frames(missing)
+        if R_raw.dtype.itemsize > dtype.itemsize:
+            R_raw = R_raw.astype(dtype)
+        R, metadata_db = transformation.dB_transform(R_raw, threshold=db_params['threshold'],
+                                                     zerovalue=db_params['zerovalue'])
+        R[~np.isfinite(R)] = db_params['zerovalue']
+        for j, i in enumerate(missing):
+            frames[i] = R[j]
+            if cache:
+                cache.put(domain, frame_times[i], db_params, R[j])
+
+    if cache:
+        print(f"{len(frames) - len(missing)} of {len(frames)} input frames taken from frame cache.")
+    return np.stack(frames)
+
+
+def has_rain(R: np.ndarray, precip_thr: float = -10.0) -> bool:
+    # R dalam dB, sehingga sama dengan rain rate > 10**(precip_thr/10) mm/h
+    return bool(np.any(R > precip_thr))
+
+
+def steps_kwargs(model_config: dict) -> dict:
+    """Keyword arguments for pysteps ``steps`` built from ``model_config``.
+
+    ``num_workers`` (``0`` or ``'auto'`` for all cores) is used by pysteps both for member-level
+    parallelism (through dask) and as the thread count of the ``pyfftw`` FFT backend.
+    ``fft_method`` selects the FFT backend and ``fft_domain`` the ``spatial``/``spectral`` mode.
+    """
+    num_workers = model_config.get('num_workers', 1)
+    if num_workers in (0, 'auto'):
+        num_workers = os.cpu_count() or 1
+    if num_workers > 1 and importlib.util.find_spec('dask') is None:
+        print("dask is not installed, STEPS ensemble members will run serially.")
+
+    return dict(
+        kmperpixel=model_config['km_per_pixel'], timestep=model_config['timestep'],
+        precip_thr=model_config.get('precip_thr', -10.0),
+        seed=model_config.get('seed', 42), extrap_kwargs={'boundary_condition': 'zero'},
+        noise_method=model_config.get('noise_method', 'parametric'), ar_order=model_config.get('ar_order', 1),
+        num_workers=num_workers, fft_method=model_config.get('fft_method', 'numpy'),
+        domain=model_config.get('fft_domain', 'spatial'),
+    )
+
+
+def load_inputs(cfg: dict, domain: str, tif_files: None | os.PathLike | str | list[str] = TIF_FILE_LIST,
+                times: list[datetime] = None) -> tuple[list[datetime], callable, dict]:
+    """Locate the input frames of ``domain``: from the observation cube for ``times``, or from GeoTIFFs.
+
+    Returns the frame times, ``load_frames(indices)`` and the metadata holding the domain geodata.
+    The geodata comes from the domain index when the frames were clipped with its current window,
+    otherwise from the cube or GeoTIFF the frames are read from.
+    """
     tif_file_list_info = cfg.get('tif_file_list_info', None)
 
-    # check tif_files argument input
-    if tif_files is not None:
-        if isinstance(tif_files, str):
-            tif_file_list_info = tif_files.format(domain=domain)
+    entry = None
+    if cfg.get('domain_index_file'):
+        try:
+            entry = load_domain_index(cfg)[domain]
+        except (FileNotFoundError, KeyError):
+            pass
+
+    def frame_geodata(shape: tuple, source_geodata: dict) -> dict:
+        if entry is not None and window_matches(entry, shape, source_geodata):
+            return domain_geodata(entry)
+        if entry is not None:
+            print(f"Input frames of {domain} ({shape[0]}x{shape[1]}) were not clipped with the current domain "
+                  f"index window, using the geodata stored with the frames.")
+        return source_geodata
+
+    metadata = {}
+
+    if times is not None and use_cube(cfg):
+        # Observation cube: frame terakhir dipetakan langsung dari memmap tanpa copy
+        times = sorted(times)
+        cube = get_cube(cfg, domain)
+        if cube is None:
+            raise FileNotFoundError(f"Observation cube for {domain} not found in {cfg['obs_store']['dir']}")
+        R_obs = np.asarray(cube.window(times))
+        metadata['geodata'] = frame_geodata(cube.shape, cube.geodata)
+        frame_times = [t.replace(tzinfo=None) for t in times]
+        load_frames = lambda indices: R_obs[indices]
+    else:
+        # check tif_files argument input
+        if tif_files is not None:
+            if isinstance(tif_files, str):
+                tif_file_list_info = tif_files.format(domain=domain)
+                with open(tif_file_list_info, 'r') as f:
+                    tif_input_files = json.load(f)
+            elif isinstance(tif_files, list):
+                tif_input_files = tif_files
+            else:
+                raise ValueError(
+                    "tif_files argument must be a json file path string containing list of tif files path, or a list of file paths.")
+        else:
+            tif_file_list_info = tif_file_list_info.format(domain=domain)
             with open(tif_file_list_info, 'r') as f:
                 tif_input_files = json.load(f)
-        elif isinstance(tif_files, list):
-            tif_input_files = tif_files
-        else:
-            raise ValueError(
-                "tif_files argument must be a json file path string containing list of tif files path, or a list of file paths.")
-    else:
-        tif_file_list_info = tif_file_list_info.format(domain=domain)
-        with open(tif_file_list_info, 'r') as f:
-            tif_input_files = json.load(f)
 
-    base_time = os.path.basename(tif_input_files[-1]).split('_')[2].split('.')[0]
-    base_time = datetime.strptime(base_time, '%Y%m%d%H%M000') + timedelta(minutes=10)
+        frame_times = [datetime.strptime(os.path.basename(f).split('_')[2].split('.')[0], '%Y%m%d%H%M000')
+                       for f in tif_input_files]
+        load_frames = lambda indices: read_tif_frames([tif_input_files[i] for i in indices])
+        metadata['geodata'] = frame_geodata(*read_tif_window(tif_input_files[-1]))
+    return frame_times, load_frames, metadata
 
-    R = []
-    metadata = {}
-    for file_path in tif_input_files:
-        with rasterio.open(file_path) as ds:
-            R.append(ds.read(1))
-            if file_path == tif_input_files[-1]:
-                metadata['geodata'] = {'projection': ds.crs.to_proj4(), 'x1': ds.bounds.left, 'y1': ds.bounds.bottom,
-                                       'x2': ds.bounds.right, 'y2': ds.bounds.top, 'yorigin': 'upper'}
-    R = np.stack(R)
 
-    R, metadata_db = transformation.dB_transform(R, threshold=0.1, zerovalue=-15.0)
-    R[~np.isfinite(R)] = -15.0
+def nowcast_frames(cfg: dict, domain: str, R: np.ndarray, frame_times: list[datetime], metadata: dict,
+                   processed_output: bool = True, plan: dict = None, record_cost: bool = True) -> xr.Dataset:
+    """Run motion estimation and the nowcast on the dB input stack ``R``.
 
-    n_input_frames = model_config['n_input_frames']
-    if R.shape[0] < n_input_frames:
-        n_input_frames = R.shape[0]
+    The tier comes from ``plan_nowcast`` unless ``plan`` is given (the mosaic plans once for all
+    tiles); dry inputs always give the zero nowcast. Without ``record_cost`` the run is not added
+    to the cost history (the mosaic records it once for all tiles).
+    """
+    model_config = cfg.get('model_config')
+    base_time = frame_times[-1] + timedelta(minutes=10)
 
-    V = dense_lucaskanade(R[-n_input_frames:, :, :])
-    V[~np.isfinite(V)] = 0.0
-    max_velocity = 100
-    V[V > max_velocity] = max_velocity
-    V[V < -max_velocity] = -max_velocity
+    # Tidak ada hujan di semua frame input: motion dan STEPS dilewati, nowcast bernilai nol
+    dry = model_config.get('skip_dry', False) and not has_rain(R, model_config.get('precip_thr', -10.0))
+    if dry:
+        print(f"No rain above precip_thr in the {len(R)} input frames of {domain}, writing a zero nowcast.")
+    else:
+        with stage(cfg, 'motion', domain=domain, base_time=base_time):
+            V = estimate_motion(cfg, domain, R, frame_times)
 
-    method = model_config.get('method', 'steps')
     n_leadtimes = model_config['n_leadtimes']
-    n_ens_members = model_config['n_ens_members']
     km_per_pixel = model_config['km_per_pixel']
     timestep = model_config['timestep']
-    precip_thr = model_config.get('precip_thr', -10.0)
+    thresholds = model_config.get('prob_thresholds', [1.0])
+    percentiles = model_config.get('percentiles', [])
+
+    # Mode streaming: reduksi ensemble per lead time lewat callback, cube penuh tidak pernah dibuat
+    streaming = processed_output and model_config.get('ensemble_reduction', 'full') == 'streaming'
+    # STEPS menghitung dalam float64, hasilnya di-cast ke dtype nowcast sebelum diproses lebih lanjut
+    dtype = nowcast_dtype(model_config)
+
+    # Tier dipilih dari sisa waktu dan memori (model_config.budget), tanpa budget selalu 'full'
+    if dry:
+        plan = {'tier': 'dry', 'method': 'dry', 'n_ens_members': 1}
+    elif plan is None:
+        plan = plan_nowcast(cfg, R.shape[1:], streaming)
+    method = plan['method']
+    n_ens_members = plan['n_ens_members']
+    steps_config = dict(model_config, n_ens_members=n_ens_members)
+    start = time.perf_counter()
 
     if method == 'steps':
         steps = nowcasts.get_method(method)
-        R_f = steps(
-            R, V, n_leadtimes, n_ens_members,
-            kmperpixel=km_per_pixel, timestep=timestep, precip_thr=precip_thr,
-            seed=42, extrap_kwargs={'boundary_condition': 'zero'},
-            noise_method='parametric', ar_order=1
-        )
+        with stage(cfg, 'steps', domain=domain, base_time=base_time):
+            if streaming:
+                reducer = EnsembleReducer(n_leadtimes, R.shape[1:], n_ens_members, thresholds, percentiles,
+                                          dtype=dtype)
+                steps(R, V, n_leadtimes, n_ens_members, callback=reducer, return_output=False,
+                      **steps_kwargs(steps_config))
+            else:
+                R_f = steps(R, V, n_leadtimes, n_ens_members, **steps_kwargs(steps_config))
+    elif method == 'extrapolation':
+        # Ekstrapolasi deterministik frame terakhir, disimpan sebagai ensemble satu member
+        streaming = False
+        extrapolate = nowcasts.get_method(method)
+        with stage(cfg, 'extrapolation', domain=domain, base_time=base_time):
+            R_f = extrapolate(R[-1], V, n_leadtimes,
+                              extrap_kwargs={'outval': model_config.get('db_zerovalue', -15.0)})[np.newaxis]
+    elif method == 'dry':
+        streaming = False
+        R_f = np.full((1, n_leadtimes, *R.shape[1:]), model_config.get('db_zerovalue', -15.0), dtype=dtype)
+    else:
+        raise ValueError(f"Invalid nowcast method: {method}. Must be 'steps' or 'extrapolation'.")
 
-    R_f = transformation.dB_transform(R_f, threshold=-10.0, inverse=True)[0]
+    if record_cost and method != 'dry' and (model_config.get('budget') or {}).get('history'):
+        workers = steps_kwargs(steps_config)['num_workers']
+        get_cost_model(cfg).record(method, R.shape[1] * R.shape[2], n_ens_members, n_leadtimes, workers,
+                                   time.perf_counter() - start)
 
-    ds = convert_to_dataset(R_f, metadata, base_time, timestep, km_per_pixel)
-    if processed_output:
-        ds = compute_ensemble(ds)
+    if streaming:
+        ds = reducer.to_dataset(forecast_coords(n_leadtimes, *R.shape[1:], metadata, base_time, timestep))
+    else:
+        R_f = transformation.dB_transform(R_f.astype(dtype, copy=False), threshold=-10.0, inverse=True)[0]
+
+        ds = convert_to_dataset(R_f, metadata, base_time, timestep, km_per_pixel)
+        if processed_output:
+            ds = compute_ensemble(ds, thresholds, percentiles)
+    ds.attrs.update(nowcast_tier=plan['tier'], nowcast_method=method, n_ens_members=n_ens_members)
+    return ds
 
+
+def save_nowcast(cfg: dict, domain: str, ds: xr.Dataset, base_time: datetime) -> str:
+    # Nama file memakai metode dari config, bukan tier yang dijalankan (tier ada di attrs dan latest_nowcast)
     output_path = cfg.get('nowcast_dir')
     output_path = output_path.format(domain=domain.lower())
     os.makedirs(output_path, exist_ok=True)
     filename = cfg.get('nowcast_output_filename_template')
-    filename = filename.format(method=method, domain=domain.lower(), base_time=base_time.strftime('%Y%m%d%H%M'))
+    filename = filename.format(method=cfg['model_config'].get('method', 'steps'), domain=domain.lower(),
+                               base_time=base_time.strftime('%Y%m%d%H%M'))
     #nc compression
-    comp = dict(zlib=True, complevel=8)
-    encoding = {var: comp for var in ds.data_vars}
+    with stage(cfg, 'netcdf_write', domain=domain, base_time=base_time) as record:
+        write_netcdf(ds, os.path.join(output_path, filename), cfg.get('nc_encoding', 'legacy'))
+        record['bytes_out'] += os.path.getsize(os.path.join(output_path, filename))
+    return os.path.join(output_path, filename)
 
-    ds.to_netcdf(os.path.join(output_path, filename), format='NETCDF4', encoding=encoding, engine='netcdf4')
-    return os.path.join(output_path, filename), ds
+
+def run_nowcasting(config: os.PathLike | str|dict, tif_files: None | os.PathLike | str | list[str] = TIF_FILE_LIST,
+                   processed_output=True, times: list[datetime] = None) -> (str,xr.Dataset):
+
+    #identify config input type
+    if isinstance(config, dict):
+        cfg = config
+    else:
+        cfg = read_run_config(config)
+
+    domain = cfg.get('domain').lower()
+    frame_times, load_frames, metadata = load_inputs(cfg, domain, tif_files, times)
+
+    base_time = frame_times[-1] + timedelta(minutes=10)
+    with stage(cfg, 'preprocess', domain=domain, base_time=base_time):
+        R = preprocess_frames(cfg, domain, frame_times, load_frames)
+
+    ds = nowcast_frames(cfg, domain, R, frame_times, metadata, processed_output)
+    return save_nowcast(cfg, domain, ds, base_time), ds
 
 
 if __name__ == '__main__':
@@ -176,6 +348,8 @@ if __name__ == '__main__':
                         help="Path to JSON file containing list of GeoTIFF files or a comma-separated list of file paths. If not provided, it will use the default path in the utils.")
     parser.add_argument('--processed_output', action='store_true',
                         help="If set, the output will not be processed to ensemble mean and probability.")
+    parser.add_argument('--full_motion', action='store_true',
+                        help="If set, the motion field is fully recomputed instead of reused or warm-started.")
     args = parser.parse_args()
 
     tif_files_input = None
@@ -185,5 +359,9 @@ if __name__ == '__main__':
         else:
             tif_files_input = args.tif_files.split(',')
 
-    ds_nowcast = run_nowcasting(config=args.config, tif_files=tif_files_input,
+    cfg = read_run_config(args.config)
+    if args.full_motion:
+        cfg['model_config'].setdefault('motion', {})['mode'] = 'full'
+
+    ds_nowcast = run_nowcasting(config=cfg, tif_files=tif_files_input,
                                 processed_output=not args.processed_output)
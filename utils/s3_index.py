@@ -0,0 +1,151 @@
+import json
+import os
+import re
+import threading
+import time as _time
+from datetime import datetime, timedelta, UTC
+
+import boto3
+from botocore import UNSIGNED
+from botocore.config import Config
+
+_CLIENTS = {}
+_INDEXES = {}
+_LOCK = threading.Lock()
+
+HOUR_PATTERN = re.compile(r'(\d{4}/\d{2}/\d{2}/\d{2})/?$')
+
+
+def get_s3_client(endpoint_url: str = None, max_pool_connections: int = 10):
+    """Return a shared anonymous S3 client, created once per endpoint and pool size."""
+    key = (endpoint_url, max_pool_connections)
+    with _LOCK:
+        if key not in _CLIENTS:
+            _CLIENTS[key] = boto3.client(
+                "s3", endpoint_url=endpoint_url,
+                config=Config(signature_version=UNSIGNED, max_pool_connections=max_pool_connections))
+        return _CLIENTS[key]
+
+
+class ListingIndex:
+    """Cached, paginated listing of S3 objects keyed by hour prefix.
+
+    Each prefix is listed through all pages and filtered on ``substring`` once. Open hours are
+    re-listed after ``ttl`` seconds; hours that ended more than ``closed_grace`` ago are treated as
+    fully published and never listed again. The index can be persisted to ``cache_file`` so that
+    closed hours survive between runs.
+    """
+
+    def __init__(self, bucket: str, client=None, substring: str = "GLB-5", ttl: float = 60,
+                 closed_grace: timedelta = timedelta(minutes=30), cache_file: str = None):
+        self.bucket = bucket
+        self.client = client if client is not None else get_s3_client()
+        self.substring = substring
+        self.ttl = ttl
+        self.closed_grace = closed_grace
+        self.cache_file = cache_file
+        self._entries = {}
+        self._prefix_locks = {}
+        self._lock = threading.Lock()
+        if cache_file:
+            self.load()
+
+    def hour_of(self, prefix: str) -> datetime | None:
+        match = HOUR_PATTERN.search(prefix)
+        if not match:
+            return None
+        return datetime.strptime(match.group(1), '%Y/%m/%d/%H').replace(tzinfo=UTC)
+
+    def is_closed(self, prefix: str, now: datetime = None) -> bool:
+        hour = self.hour_of(prefix)
+        if hour is None:
+            return False
+        now = now or datetime.now(UTC)
+        return now >= hour + timedelta(hours=1) + self.closed_grace
+
+    def _list_all(self, prefix: str) -> list[dict]:
+        objects = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                if self.substring is None or self.substring in obj["Key"]:
+                    objects.append({"Key": obj["Key"], "LastModified": obj["LastModified"], "Size": obj.get("Size")})
+        return objects
+
+    def list(self, prefix: str) -> list[dict]:
+        with self._lock:
+            prefix_lock = self._prefix_locks.setdefault(prefix, threading.Lock())
+
+        with prefix_lock:
+            entry = self._entries.get(prefix)
+            if entry and (entry['closed'] or _time.time() - entry['listed_at'] < self.ttl):
+                return entry['objects']
+
+            # closed dihitung sebelum listing agar objek terakhir tidak terlewat
+            closed = self.is_closed(prefix)
+            print(f"Listing s3://{self.bucket}/{prefix}")
+            objects = self._list_all(prefix)
+            self._entries[prefix] = {'listed_at': _time.time(), 'closed': closed, 'objects': objects}
+
+        if closed and self.cache_file:
+            self.save()
+        return objects
+
+    def invalidate(self, prefix: str = None):
+        with self._lock:
+            if prefix is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(prefix, None)
+
+    def load(self):
+        if not os.path.isfile(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r') as f:
+                cached = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable listing cache {self.cache_file}: {e}")
+            return
+        for prefix, entry in cached.get(self.bucket, {}).items():
+            for obj in entry['objects']:
+                obj['LastModified'] = datetime.fromisoformat(obj['LastModified'])
+            self._entries[prefix] = entry
+
+    def save(self):
+        # Hanya jam yang sudah tertutup yang disimpan, jam berjalan selalu di-list ulang
+        with self._lock:
+            closed = {
+                prefix: {
+                    'listed_at': entry['listed_at'],
+                    'closed': True,
+                    'objects': [dict(obj, LastModified=obj['LastModified'].isoformat()) for obj in entry['objects']],
+                }
+                for prefix, entry in self._entries.items() if entry['closed']
+            }
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+        tmp_file = f"{self.cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump({self.bucket: closed}, f)
+        os.replace(tmp_file, self.cache_file)
+
+
+def get_listing_index(cfg: dict) -> ListingIndex:
+    """Return the process-wide ListingIndex for the endpoint and bucket in ``cfg``."""
+    bucket = cfg.get('bucket_name')
+    key = (cfg.get('s3_endpoint_url'), bucket)
+    listing_cfg = cfg.get('s3_listing') or {}
+    with _LOCK:
+        index = _INDEXES.get(key)
+    if index is None:
+        index = ListingIndex(
+            bucket,
+            client=get_s3_client(cfg.get('s3_endpoint_url'), cfg.get('s3_max_pool_connections', 32)),
+            substring=cfg.get('product', 'GLB-5'),
+            ttl=listing_cfg.get('ttl_seconds', 60),
+            closed_grace=timedelta(minutes=listing_cfg.get('closed_grace_minutes', 30)),
+            cache_file=listing_cfg.get('cache_file'),
+        )
+        with _LOCK:
+            index = _INDEXES.setdefault(key, index)
+    return index
@@ -0,0 +1,120 @@
+import json
+import os
+import threading
+import time as _time
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _read_state(state_file: str, etag: str, size: int, part_size: int) -> set:
+    # Bagian yang sudah selesai hanya dipakai jika objeknya dan ukuran part-nya masih sama
+    try:
+        with open(state_file, 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    if state.get('etag') != etag or state.get('size') != size or state.get('part_size') != part_size:
+        return set()
+    return set(state.get('done', []))
+
+
+def _write_state(state_file: str, etag: str, size: int, part_size: int, done: set):
+    tmp_file = f"{state_file}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump({'etag': etag, 'size': size, 'part_size': part_size, 'done': sorted(done)}, f)
+    os.replace(tmp_file, state_file)
+
+
+def _discard(part_file: str, state_file: str):
+    for path in (part_file, state_file):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _precondition_failed(e: Exception) -> bool:
+    return getattr(e, 'response', {}).get('Error', {}).get('Code') in ('PreconditionFailed', '412')
+
+
+def _get_range(client, bucket: str, key: str, etag: str, part_file: str, start: int, end: int, retries: int):
+    # IfMatch: setiap part harus dari versi objek yang sama dengan HEAD
+    extra = {'IfMatch': etag} if etag else {}
+    for attempt in range(retries + 1):
+        try:
+            obj = client.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}", **extra)
+            with open(part_file, 'r+b') as f:
+                f.seek(start)
+                for chunk in obj["Body"].iter_chunks(CHUNK_SIZE):
+                    f.write(chunk)
+            return
+        except Exception as e:
+            if attempt == retries or _precondition_failed(e):
+                raise
+            wait = 2 ** attempt
+            print(f"Range {start}-{end} of {key} failed ({e}), retrying in {wait}s...")
+            _time.sleep(wait)
+
+
+def download_object(client, bucket: str, key: str, dest: str, part_size: int = 8 * CHUNK_SIZE,
+                    max_workers: int = 8, retries: int = 3) -> str:
+    """Download ``key`` to ``dest`` with concurrent byte-range GETs.
+
+    Parts are streamed into ``dest + '.part'`` and completed parts are recorded in a small JSON
+    sidecar, so an interrupted download resumes from the missing parts as long as the object's
+    ETag and part size are unchanged. Every part is requested with ``IfMatch`` on that ETag. The
+    file is renamed to ``dest`` only once every part is written; if the object changes mid-download
+    or the result is incomplete, the partial file and sidecar are removed so a retry starts clean.
+    """
+    head = client.head_object(Bucket=bucket, Key=key)
+    size = head["ContentLength"]
+    etag = head.get("ETag", "")
+
+    part_file = f"{dest}.part"
+    state_file = f"{dest}.part.json"
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+
+    ranges = [(i, start, min(start + part_size, size) - 1) for i, start in enumerate(range(0, size, part_size))]
+    done = _read_state(state_file, etag, size, part_size) if os.path.isfile(part_file) else set()
+    if not done:
+        with open(part_file, 'wb') as f:
+            f.truncate(size)
+    else:
+        print(f"Resuming {key}: {len(done)}/{len(ranges)} parts already downloaded")
+
+    todo = [r for r in ranges if r[0] not in done]
+    lock = threading.Lock()
+
+    def fetch_part(part):
+        i, start, end = part
+        _get_range(client, bucket, key, etag, part_file, start, end, retries)
+        with lock:
+            done.add(i)
+            _write_state(state_file, etag, size, part_size, done)
+
+    changed = None
+    if todo:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(todo)))) as pool:
+            # list() agar exception dari part manapun dilempar ke pemanggil
+            try:
+                list(pool.map(fetch_part, todo))
+            except Exception as e:
+                if not _precondition_failed(e):
+                    raise
+                changed = e
+    # Dibuang setelah semua thread selesai, agar tidak ada yang masih menulis ke .part
+    if changed is not None:
+        _discard(part_file, state_file)
+        raise IOError(f"{key} changed on S3 during the download, partial file discarded") from changed
+
+    # .part sudah dipotong ke ukuran penuh sejak awal, jadi yang dicek adalah setiap part selesai
+    missing = [i for i, _, _ in ranges if i not in done]
+    part_bytes = os.path.getsize(part_file)
+    if missing or part_bytes != size:
+        _discard(part_file, state_file)
+        raise IOError(f"Download of {key} is incomplete ({len(ranges) - len(missing)}/{len(ranges)} parts, "
+                      f"{part_bytes} of {size} bytes)")
+
+    os.replace(part_file, dest)
+    if os.path.exists(state_file):
+        os.remove(state_file)
+    return dest
@@ -0,0 +1,194 @@
+import glob
+import json
+import os
+import re
+import threading
+import time as _time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, UTC
+
+try:
+    from s3_index import get_listing_index
+    from instrument import stage
+except ModuleNotFoundError:
+    from utils.s3_index import get_listing_index
+    from utils.instrument import stage
+
+
+class Scheduler:
+    """Resident pipeline loop: poll for new SCaMPR frames and run ingest -> nowcast -> render.
+
+    The source is either the S3 listing (``scheduler.source: s3``) or, as a local stand-in,
+    ``nc_dir`` where a separate downloader drops files (``local``). When a frame newer than the
+    last one handled lands, the frames for ``prior_steps`` are ingested once for all domains and
+    the domains run concurrently in ``domain_workers`` threads.
+
+    Backpressure: only one cycle runs at a time. Frames arriving while a cycle is busy are
+    coalesced, so the next cycle starts from the newest frame and intermediate ones are skipped
+    rather than queued. Clients, listing index, domain index, frame cache and observation cubes
+    are module-level caches and stay warm for the lifetime of the process. A cycle that fails
+    (e.g. ingest errors) is retried from the next poll unless a newer frame has arrived.
+
+    ``ingest`` and ``run_domain`` are the pipeline stages from ``main.py``.
+    """
+
+    def __init__(self, cfg: dict, domains: list[str], ingest, run_domain):
+        sched_cfg = cfg.get('scheduler') or {}
+        self.cfg = cfg
+        self.domains = domains
+        self.ingest = ingest
+        self.run_domain = run_domain
+        self.source = sched_cfg.get('source', 's3')
+        self.poll_seconds = sched_cfg.get('poll_seconds', 15)
+        self.settle_seconds = sched_cfg.get('settle_seconds', 5)
+        self.domain_workers = max(1, int(sched_cfg.get('domain_workers', 2)))
+        if self.source not in ('s3', 'local'):
+            raise ValueError(f"Invalid scheduler source: {self.source}. Must be 's3' or 'local'.")
+
+        self.last_frame = None
+        self.last_seen = None
+        self.pending = None
+        self.cycles = 0
+        self._busy = threading.Lock()
+        self._state = threading.Lock()
+        self._stop = threading.Event()
+        self._worker = None
+
+    def now(self) -> datetime:
+        return datetime.now(UTC)
+
+    def latest_frame(self) -> datetime | None:
+        if self.source == 's3':
+            return self._latest_s3()
+        return self._latest_local()
+
+    def _latest_s3(self) -> datetime | None:
+        index = get_listing_index(self.cfg)
+        now = self.now()
+        latest = None
+        for hour in (now, now - timedelta(hours=1)):
+            prefix = self.cfg['prefix'].format(datestring=hour.strftime('%Y/%m/%d/%H'))
+            if not index.is_closed(prefix, now):
+                # jam berjalan selalu di-list ulang setiap polling
+                index.invalidate(prefix)
+            for obj in index.list(prefix):
+                t = datetime.strptime(os.path.basename(obj['Key']).split('_')[3][1:], '%Y%m%d%H%M000')
+                latest = t if latest is None else max(latest, t)
+            if latest is not None:
+                break
+        return latest.replace(tzinfo=UTC) if latest else None
+
+    def _latest_local(self) -> datetime | None:
+        template = self.cfg['nc_filename_template']
+        pattern = re.compile(re.escape(template).replace(re.escape('{datestring}'), r'(\d{15})') + '$')
+        cutoff = _time.time() - self.settle_seconds
+        latest = None
+        for path in glob.glob(os.path.join(self.cfg['nc_dir'], template.format(datestring='*'))):
+            match = pattern.search(os.path.basename(path))
+            # file yang masih ditulis (mtime terlalu baru) dilewati dulu
+            if not match or os.path.getmtime(path) > cutoff:
+                continue
+            t = datetime.strptime(match.group(1), '%Y%m%d%H%M000')
+            latest = t if latest is None else max(latest, t)
+        return latest.replace(tzinfo=UTC) if latest else None
+
+    def is_done(self, domain: str, frame_time: datetime) -> bool:
+        """True if the latest nowcast of ``domain`` already starts from ``frame_time`` (e.g. after a restart)."""
+        info = self.cfg.get('latest_nowcast_info')
+        if not info:
+            return False
+        try:
+            with open(info.format(domain=domain.lower()), 'r') as f:
+                base_time = json.load(f)['base_time']
+        except (OSError, ValueError, KeyError):
+            return False
+        return base_time == (frame_time + timedelta(minutes=10)).strftime('%Y%m%d%H%M000')
+
+    def run_cycle(self, frame_time: datetime):
+        start = _time.time()
+        domains = [d for d in self.domains if not self.is_done(d, frame_time)]
+        if not domains:
+            print(f"Nowcasts for {frame_time:%Y%m%d%H%M} already exist, nothing to do.")
+            return
+
+        print(f"===== Cycle {frame_time:%Y%m%d%H%M}: {len(domains)} domain(s) =====")
+        with stage(self.cfg, 'cycle', base_time=frame_time + timedelta(minutes=10)):
+            self._run_cycle(frame_time, domains, start)
+
+    def _run_cycle(self, frame_time: datetime, domains: list[str], start: float):
+        time_list = sorted(frame_time - timedelta(minutes=10 * i) for i in range(self.cfg['prior_steps']))
+        available = self.ingest(self.cfg, time_list, domains)
+
+        failed = []
+
+        def run(domain: str):
+            try:
+                self.run_domain(dict(self.cfg, domain=domain, cycle_start=start), available[domain], frame_time)
+            except Exception as e:
+                print(f"Domain {domain} failed: {e}")
+                failed.append(domain)
+
+        with ThreadPoolExecutor(max_workers=min(self.domain_workers, len(domains))) as executor:
+            list(executor.map(run, domains))
+
+        print(f"Cycle {frame_time:%Y%m%d%H%M} finished in {_time.time() - start:.1f}s"
+              + (f", {len(failed)} domain(s) failed: {failed}" if failed else ""))
+
+    def _drain(self, frame_time: datetime):
+        # Jalankan siklus, lalu siklus untuk frame terbaru yang masuk selama siklus sebelumnya berjalan
+        while frame_time is not None:
+            try:
+                self.run_cycle(frame_time)
+                ok = True
+            except Exception as e:
+                print(f"Cycle {frame_time:%Y%m%d%H%M} failed: {e}")
+                ok = False
+            self.cycles += 1
+            with self._state:
+                if ok:
+                    self.last_frame = frame_time
+                elif self.pending is None:
+                    # Frame yang gagal dicoba lagi pada polling berikutnya
+                    self.last_seen = self.last_frame
+                frame_time, self.pending = self.pending, None
+                if frame_time is None:
+                    self._busy.release()
+
+    def poll(self):
+        try:
+            frame_time = self.latest_frame()
+        except Exception as e:
+            print(f"Polling {self.source} failed: {e}")
+            return
+        with self._state:
+            if frame_time is None or (self.last_seen is not None and frame_time <= self.last_seen):
+                return
+            print(f"New frame available: {frame_time:%Y%m%d%H%M}")
+            self.last_seen = frame_time
+            if not self._busy.acquire(blocking=False):
+                if self.pending is not None:
+                    print(f"Skipping frame {self.pending:%Y%m%d%H%M}, superseded while busy.")
+                self.pending = frame_time
+                return
+        self._worker = threading.Thread(target=self._drain, args=(frame_time,), daemon=True)
+        self._worker.start()
+
+    def run(self, max_cycles: int = None):
+        """Poll until stopped (or until ``max_cycles`` cycles have finished)."""
+        print(f"Scheduler started: source={self.source}, poll every {self.poll_seconds}s, "
+              f"{len(self.domains)} domain(s), {self.domain_workers} concurrent.")
+        try:
+            while not self._stop.is_set():
+                self.poll()
+                if max_cycles is not None and self.cycles >= max_cycles and not self._busy.locked():
+                    break
+                self._stop.wait(self.poll_seconds)
+        except KeyboardInterrupt:
+            print("Scheduler interrupted.")
+        if self._worker is not None and self._worker.is_alive():
+            print("Waiting for the running cycle to finish...")
+            self._worker.join()
+        print("Scheduler stopped.")
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,88 @@
+import math
+import os
+from functools import lru_cache
+
+import numpy as np
+import xarray as xr
+
+try:
+    from png_renderer import color_index, north_up, write_png
+except ModuleNotFoundError:
+    from utils.png_renderer import color_index, north_up, write_png
+
+TILE_SIZE = 256
+MAX_LAT = 85.0511287798
+
+
+def lonlat_to_tile(lon: float, lat: float, zoom: int) -> tuple[int, int]:
+    n = 2 ** zoom
+    lat = max(-MAX_LAT, min(MAX_LAT, lat))
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_range(bounds: tuple, zoom: int) -> tuple[int, int, int, int]:
+    """Tiles ``(x0, y0, x1, y1)`` (inclusive) covering ``bounds = (west, south, east, north)``."""
+    west, south, east, north = bounds
+    x0, y0 = lonlat_to_tile(west, north, zoom)
+    x1, y1 = lonlat_to_tile(east, south, zoom)
+    return x0, y0, x1, y1
+
+
+@lru_cache(maxsize=64)
+def index_map(west: float, north: float, dlon: float, dlat: float, nx: int, ny: int, zoom: int) -> tuple:
+    """Nearest-cell index map from Web Mercator pixels of the covering tiles to a north-up grid.
+
+    The projection is separable, so the map is one row index per pixel row and one column index per
+    pixel column. Pixels outside the grid point to index ``ny``/``nx``, a transparent padding cell.
+    Cached per grid and zoom level.
+    """
+    x0, y0, x1, y1 = tile_range((west, north - ny * dlat, west + nx * dlon, north), zoom)
+    world = TILE_SIZE * 2 ** zoom
+
+    px = np.arange(x0 * TILE_SIZE, (x1 + 1) * TILE_SIZE) + 0.5
+    lon = px / world * 360.0 - 180.0
+    cols = np.floor((lon - west) / dlon).astype('intp')
+    cols[(cols < 0) | (cols >= nx)] = nx
+
+    py = np.arange(y0 * TILE_SIZE, (y1 + 1) * TILE_SIZE) + 0.5
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * py / world))))
+    rows = np.floor((north - lat) / dlat).astype('intp')
+    rows[(rows < 0) | (rows >= ny)] = ny
+    return (x0, y0), rows, cols
+
+
+def render_tiles(da: xr.DataArray, tile_dir: str, zooms: range, compress_level: int = 6) -> dict[str, list[str]]:
+    """Write XYZ tiles ``tile_dir/{z}/{x}/{y}.png`` of a (lat, lon) rain rate field.
+
+    Fully transparent tiles are skipped. Returns the written tiles as ``{z: ["x/y", ...]}``.
+    """
+    index = color_index(north_up(da))
+    ny, nx = index.shape
+    dlon = abs(float(da.lon[1] - da.lon[0]))
+    dlat = abs(float(da.lat[1] - da.lat[0]))
+    west = float(da.lon.min()) - dlon / 2
+    north = float(da.lat.max()) + dlat / 2
+
+    # Sel tambahan transparan untuk piksel di luar grid
+    padded = np.zeros((ny + 1, nx + 1), dtype='uint8')
+    padded[:ny, :nx] = index
+
+    written = {}
+    for zoom in zooms:
+        (x0, y0), rows, cols = index_map(round(west, 6), round(north, 6), round(dlon, 9), round(dlat, 9), nx, ny, zoom)
+        image = padded[np.ix_(rows, cols)]
+        tiles = []
+        for j in range(image.shape[0] // TILE_SIZE):
+            for i in range(image.shape[1] // TILE_SIZE):
+                tile = image[j * TILE_SIZE:(j + 1) * TILE_SIZE, i * TILE_SIZE:(i + 1) * TILE_SIZE]
+                if not tile.any():
+                    continue
+                x, y = x0 + i, y0 + j
+                path = os.path.join(tile_dir, str(zoom), str(x), f"{y}.png")
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                write_png(path, tile, compress_level=compress_level)
+                tiles.append(f"{x}/{y}")
+        written[str(zoom)] = tiles
+    return written